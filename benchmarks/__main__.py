@@ -0,0 +1,87 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.cases import run_all
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Names of the cases slower than `baseline` by more than `threshold`."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        change = current["ops_per_sec"] / reference["ops_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45s} {reference['ops_per_sec']:>14,.0f} -> "
+              f"{current['ops_per_sec']:>14,.0f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput benchmarks of the simulation and learning "
+                    "hot paths.")
+    parser.add_argument("--out", type=str, default="bench_results.json",
+                        help="JSON file receiving the results")
+    parser.add_argument("--baseline", type=str,
+                        help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed slowdown before a case is reported "
+                             "as a regression")
+    parser.add_argument("--steps", type=int, default=20_000,
+                        help="Operations per micro benchmark run")
+    parser.add_argument("--episodes", type=int, default=200,
+                        help="Episodes per training benchmark run")
+    parser.add_argument("--num_envs", type=int, default=1024,
+                        help="Boards per vectorized benchmark")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per case, the best one is kept")
+    args = parser.parse_args()
+
+    results = {
+        name: {"ops_per_sec": ops, "params": params}
+        for name, (ops, params) in run_all(args.steps, args.episodes,
+                                           args.num_envs,
+                                           args.repeat).items()
+    }
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "steps": args.steps,
+            "episodes": args.episodes,
+            "num_envs": args.num_envs,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above "
+                  f"{args.threshold:.0%}")
+            sys.exit(1)
+    else:
+        for name, result in results.items():
+            print(f"{name:45s} {result['ops_per_sec']:>14,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
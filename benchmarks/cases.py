@@ -0,0 +1,210 @@
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from snake.action import ActionState, index_to_action_tuple
+from snake.agent import QLearningSnakeAgent
+from snake.env import SnakeEnv
+from snake.interpreter import Interpreter, NUM_STATES, decode_state
+from snake.phases import PhaseConfig
+from snake.train import train_with_phases
+from snake.vec_env import VecSnakeEnv
+
+MAP_SIZES = (5, 10, 15, 20)
+SNAKE_LENGTHS = (3, 8, 16)
+SEED = 42
+
+
+def measure(run: Callable[[], int], repeat: int) -> float:
+    """Best throughput of `repeat` runs; `run` returns its op count."""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = run()
+        elapsed = time.perf_counter() - start
+        best = max(best, ops / elapsed)
+    return best
+
+
+def _fits(map_size: int, length: int) -> bool:
+    return length <= map_size * map_size // 3
+
+
+def _record_actions(map_size: int, length: int,
+                    steps: int) -> List[int]:
+    """
+    Actions of a snake that avoids immediate danger when it can, so the
+    replayed trajectory keeps a realistic length instead of dying at once.
+    """
+    env = SnakeEnv(map_size, length, 1, 2, seed=SEED)
+    interpreter = Interpreter()
+    rng = random.Random(SEED)
+    actions = []
+    for _ in range(steps):
+        dangers = decode_state(interpreter.get_state(env.snake,
+                                                     env.board))[:4]
+        safe = [i for i, danger in enumerate(dangers) if not danger]
+        action = rng.choice(safe or [0, 1, 2, 3])
+        actions.append(action)
+        env.direction = index_to_action_tuple(action)
+        result = env.step()
+        if result.action_state == ActionState.DEAD or not result.snake_length:
+            env.reset()
+    return actions
+
+
+def _replay(env: SnakeEnv, actions: List[int], on_step=None) -> int:
+    for action in actions:
+        env.direction = index_to_action_tuple(action)
+        result = env.step()
+        if on_step is not None:
+            on_step(env)
+        if result.action_state == ActionState.DEAD or not result.snake_length:
+            env.reset()
+    return len(actions)
+
+
+def bench_env_step(map_size, length, steps, repeat) -> float:
+    actions = _record_actions(map_size, length, steps)
+
+    def run():
+        return _replay(SnakeEnv(map_size, length, 1, 2, seed=SEED), actions)
+
+    return measure(run, repeat)
+
+
+def bench_env_reset(map_size, length, steps, repeat) -> float:
+    env = SnakeEnv(map_size, length, 1, 2, seed=SEED)
+    count = max(steps // 20, 1)
+
+    def run():
+        env.rng.seed(SEED)
+        for _ in range(count):
+            env.reset()
+        return count
+
+    return measure(run, repeat)
+
+
+def bench_get_state(map_size, length, steps, repeat) -> float:
+    actions = _record_actions(map_size, length, steps)
+    snapshots = []
+    _replay(SnakeEnv(map_size, length, 1, 2, seed=SEED), actions,
+            lambda env: snapshots.append((env.snake.copy(),
+                                          env.board.copy())))
+    interpreter = Interpreter()
+
+    def run():
+        for snake, board in snapshots:
+            interpreter.get_state(snake, board)
+        return len(snapshots)
+
+    return measure(run, repeat)
+
+
+def _agent_inputs(steps):
+    rng = np.random.default_rng(SEED)
+    agent = QLearningSnakeAgent(train=True, epsilon=0.1)
+    agent.q_table[:] = rng.normal(size=agent.q_table.shape)
+    states = rng.integers(0, NUM_STATES, size=steps).tolist()
+    actions = rng.integers(0, 4, size=steps).tolist()
+    rewards = rng.normal(size=steps).tolist()
+    return agent, states, actions, rewards
+
+
+def bench_choose_action(steps, repeat) -> float:
+    agent, states, _, _ = _agent_inputs(steps)
+
+    def run():
+        for state in states:
+            agent.choose_action(state)
+        return len(states)
+
+    return measure(run, repeat)
+
+
+def bench_update(steps, repeat) -> float:
+    agent, states, actions, rewards = _agent_inputs(steps)
+    transitions = list(zip(states, actions, rewards, states[1:]))
+
+    def run():
+        for state, action, reward, next_state in transitions:
+            agent.update(state, action, reward, next_state, False)
+        return len(transitions)
+
+    return measure(run, repeat)
+
+
+def bench_train_episodes(map_size, episodes, repeat) -> float:
+    def run():
+        agent = QLearningSnakeAgent(train=True, seed=SEED)
+        env = SnakeEnv(map_size, 3, 1, 2, seed=SEED)
+        phases = [PhaseConfig("Benchmark", episodes, 1.0, 0.1)]
+        train_with_phases(agent, env, Interpreter(), phases, 1000,
+                          progress=False)
+        return episodes
+
+    return measure(run, repeat)
+
+
+def bench_vec_env_step(map_size, num_envs, steps, repeat) -> float:
+    rng = np.random.default_rng(SEED)
+    actions = rng.integers(0, 4, size=(max(steps // num_envs, 1), num_envs))
+
+    def run():
+        env = VecSnakeEnv(num_envs, map_size, 3, 1, 2, seed=SEED)
+        for batch in actions:
+            env.step(batch)
+        return actions.size
+
+    return measure(run, repeat)
+
+
+def bench_get_state_batch(map_size, num_envs, steps, repeat) -> float:
+    env = VecSnakeEnv(num_envs, map_size, 3, 1, 2, seed=SEED)
+    interpreter = Interpreter()
+    calls = max(steps // num_envs, 1)
+
+    def run():
+        for _ in range(calls):
+            interpreter.get_state_batch(env.boards, env.heads, env.tails)
+        return calls * num_envs
+
+    return measure(run, repeat)
+
+
+def run_all(steps: int = 20_000, episodes: int = 200, num_envs: int = 1024,
+            repeat: int = 5) -> Dict[str, Tuple[float, dict]]:
+    """Run every case; return {name: (ops per second, parameters)}."""
+    results = {}
+
+    for map_size in MAP_SIZES:
+        for length in SNAKE_LENGTHS:
+            if not _fits(map_size, length):
+                continue
+            params = {"map_size": map_size, "snake_length": length}
+            suffix = f"map{map_size}_len{length}"
+            results[f"env_step[{suffix}]"] = (
+                bench_env_step(map_size, length, steps, repeat), params)
+            results[f"env_reset[{suffix}]"] = (
+                bench_env_reset(map_size, length, steps, repeat), params)
+            results[f"get_state[{suffix}]"] = (
+                bench_get_state(map_size, length, steps, repeat), params)
+
+        params = {"map_size": map_size, "num_envs": num_envs}
+        suffix = f"map{map_size}_n{num_envs}"
+        results[f"vec_env_step[{suffix}]"] = (
+            bench_vec_env_step(map_size, num_envs, steps * 10, repeat),
+            params)
+        results[f"get_state_batch[{suffix}]"] = (
+            bench_get_state_batch(map_size, num_envs, steps * 10, repeat),
+            params)
+        results[f"train_episodes[map{map_size}]"] = (
+            bench_train_episodes(map_size, episodes, repeat),
+            {"map_size": map_size, "episodes": episodes})
+
+    results["choose_action"] = (bench_choose_action(steps, repeat), {})
+    results["update"] = (bench_update(steps, repeat), {})
+    return results
@@ -16,10 +16,7 @@ class ActionState(Enum):
 
 
 class ActionResult:
-    action_state = None
-    new_state = None
-    snake_length = None
-    cause_death = None
+    __slots__ = ("action_state", "new_state", "snake_length", "cause_death")
 
     def __init__(self, action_state, new_state, snake_length,
                  cause_death=None):
@@ -1,14 +1,67 @@
 import numpy as np
-import random
 import pickle
-from collections import defaultdict
+
+from snake.interpreter import NUM_STATES, encode_state
+from snake.model_io import is_binary_model, load_q_table, save_q_table
+from snake.rng import BlockRandom
 
 ACTIONS = ['UP', 'DOWN', 'LEFT', 'RIGHT']
 
+# Actions whose bit is set, for every bitmask of actions
+_MASK_ACTIONS = [tuple(a for a in range(len(ACTIONS)) if mask >> a & 1)
+                 for mask in range(1 << len(ACTIONS))]
+
+
+def new_q_table() -> np.ndarray:
+    return np.zeros((NUM_STATES, len(ACTIONS)), dtype=np.float64)
+
+
+def convert_legacy_q_table(q_table: dict) -> np.ndarray:
+    """
+    Convert a q_table saved as {state tuple: q-values} into a dense table
+    indexed by state code.
+    """
+    dense = new_q_table()
+    for state, q_values in q_table.items():
+        dense[encode_state(state)] = q_values
+    return dense
+
+
+def read_q_table(path: str, writable: bool = True) -> np.ndarray:
+    """
+    Read a model saved in the binary format or pickled.
+
+    A binary model that is not meant to be written is returned as a
+    read-only memmap instead of being loaded.
+    """
+    if is_binary_model(path):
+        q_table = load_q_table(path)
+        return np.array(q_table) if writable else q_table
+
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+
+    q_table = data['q_table']
+    if isinstance(q_table, dict):
+        q_table = convert_legacy_q_table(q_table)
+    return np.array(q_table, dtype=np.float64)
+
+
+def compile_policy(q_table: np.ndarray) -> list:
+    """
+    Greedy actions of every state code: the tuple of the actions tied for
+    the best Q-value, most often a single one.
+    """
+    q_table = np.asarray(q_table)
+    best = q_table == q_table.max(axis=1, keepdims=True)
+    masks = best @ (1 << np.arange(best.shape[1]))
+    return [_MASK_ACTIONS[mask] for mask in masks.tolist()]
+
 
 class QLearningSnakeAgent:
     def __init__(self, alpha=0.15, gamma=0.95, epsilon=1.0, eps_decay=0.1,
-                 eps_min=0.001, load_path=None, save_path=None, train=False):
+                 eps_min=0.001, load_path=None, save_path=None, train=False,
+                 seed=None):
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
@@ -17,8 +70,10 @@ class QLearningSnakeAgent:
 
         self.is_train = train
         self.save_path = save_path
+        self.rng = BlockRandom(seed)
 
-        self.q_table = defaultdict(lambda: np.zeros(len(ACTIONS)))
+        self.q_table = new_q_table()
+        self.policy = None
 
         if load_path:
             self.load_model(load_path)
@@ -29,29 +84,75 @@ class QLearningSnakeAgent:
 
         self.eps_decay = (self.eps_min / self.epsilon) ** (1 / episodes)
 
-    def choose_action(self, state: tuple):
-        if self.is_train and random.random() < self.epsilon:
-            return random.randrange(len(ACTIONS))
+    def compile_policy(self) -> None:
+        """
+        Act from a compiled policy of the current Q-table until
+        `drop_policy`, whenever the agent is not training. Ties are still
+        broken by a draw of the agent's random stream, as without it.
+        """
+        self.policy = compile_policy(self.q_table)
+
+    def drop_policy(self) -> None:
+        self.policy = None
+
+    def choose_action(self, state: int):
+        if self.policy is not None and not self.is_train:
+            actions = self.policy[state]
+            if len(actions) == 1:
+                return actions[0]
+            return actions[self.rng.randrange(len(actions))]
+
+        if self.is_train and self.rng.random() < self.epsilon:
+            return self.rng.randrange(len(ACTIONS))
 
-        q_values = self.q_table[state]
+        # tolist() copies the row: with a shared table (Hogwild) another
+        # process may write it between the max and the comparison below.
+        q_values = self.q_table[state].tolist()
 
         # Tie-breaking
-        max_q = np.max(q_values)
-        max_actions = np.where(q_values == max_q)[0]
-        return np.random.choice(max_actions)
+        max_q = max(q_values)
+        max_actions = [i for i, q in enumerate(q_values) if q == max_q]
+        if len(max_actions) == 1:
+            return max_actions[0]
+        return max_actions[self.rng.randrange(len(max_actions))]
 
     def update(self, state, action, reward, next_state, done):
         """
         Q(s,a) += alpha * [r + gamma * max_a' Q(s',a') - Q(s,a)]
+
+        Returns the TD error, the bracketed term.
         """
-        current = self.q_table[state][action]
+        current = self.q_table[state, action]
 
         if done:
             target = reward
         else:
-            target = reward + self.gamma * np.max(self.q_table[next_state])
+            target = reward + self.gamma * self.q_table[next_state].max()
+
+        td_error = target - current
+        self.q_table[state, action] = current + self.alpha * td_error
+        return td_error
+
+    def update_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Apply the TD update of `update` to a minibatch of transitions.
 
-        self.q_table[state][action] = current + self.alpha * (target - current)
+        Targets are computed from the table before the batch is applied,
+        and a (state, action) pair drawn several times takes one step of
+        its mean TD error, so duplicates cannot overshoot the target.
+        Returns the TD errors of the batch.
+        """
+        current = self.q_table[states, actions]
+        next_max = self.q_table[next_states].max(axis=1)
+        target = np.where(dones, rewards, rewards + self.gamma * next_max)
+
+        td_errors = target - current
+        pairs = np.asarray(states) * len(ACTIONS) + np.asarray(actions)
+        _, inverse, counts = np.unique(pairs, return_inverse=True,
+                                       return_counts=True)
+        np.add.at(self.q_table, (states, actions),
+                  self.alpha * td_errors / counts[inverse])
+        return td_errors
 
     def decay_epsilon(self):
         self.epsilon = max(self.eps_min, self.epsilon * self.eps_decay)
@@ -61,22 +162,21 @@ class QLearningSnakeAgent:
             if self.save_path is None:
                 return
 
-            data = {'q_table': dict(self.q_table)}
+            if self.save_path.endswith('.pkl'):
+                data = {'q_table': np.asarray(self.q_table)}
 
-            with open(self.save_path, 'wb') as f:
-                pickle.dump(data, f)
+                with open(self.save_path, 'wb') as f:
+                    pickle.dump(data, f)
+            else:
+                save_q_table(self.save_path, self.q_table)
             print(f"Model saved to {self.save_path}")
         except Exception as e:
             print(f"Error when saving model : {e}")
 
     def load_model(self, path):
         try:
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
-
-                self.q_table = defaultdict(lambda: np.zeros(len(ACTIONS)),
-                                           data['q_table'])
+            self.q_table = read_q_table(path, writable=self.is_train)
 
         except Exception as e:
             print(f"Error when loading model : {e}")
-            self.q_table = defaultdict(lambda: np.zeros(len(ACTIONS)))
+            self.q_table = new_q_table()
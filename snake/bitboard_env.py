@@ -0,0 +1,254 @@
+from collections import deque
+from typing import Deque, List, Optional, Set
+
+import numpy as np
+
+from snake.action import ActionResult, ActionState
+from snake.env import (BODY, GREEN_APPLE, HEAD, RED_APPLE, WALL,
+                       Coordinate, SnakeEnv)
+from snake.rng import BlockRandom
+
+# Random cells tried before free cells are listed from the bitboards
+MAX_REJECTIONS = 16
+
+
+class BitboardSnakeEnv:
+    """
+    Snake game with the same rules and interface as SnakeEnv, storing the
+    board as Python-int bitboards.
+
+    Cell (x, y) of the padded (map_size + 2)² board is bit x * width + y,
+    so a column is a contiguous run of bits and moving one cell is a
+    shift. Walls, snake cells (head included) and each apple type have
+    their own bitboard, which makes collisions bit tests and lets
+    Interpreter.get_state_bitboard cast rays with a few masks, whatever
+    the map size.
+
+    Random draws differ from SnakeEnv, so the same seed gives other games.
+    """
+
+    backend = "bitboard"
+
+    def __init__(
+            self,
+            map_size: int,
+            snake_start_length: int,
+            red_apple_count: int,
+            green_apple_count: int,
+            seed: Optional[int] = None,
+    ) -> None:
+        if map_size < 3:
+            raise ValueError("map_size must be at least 3.")
+
+        if snake_start_length < 2:
+            raise ValueError("snake_start_length must be at least 2.")
+        self.rng = BlockRandom(seed)
+        self.map_size = map_size
+        self.snake_start_length = snake_start_length
+        self.red_apple_count = red_apple_count
+        self.green_apple_count = green_apple_count
+
+        self.width = width = map_size + 2
+        self.column_mask = (1 << width) - 1
+        self.row_masks = [sum(1 << (x * width + y) for x in range(width))
+                          for y in range(width)]
+        self.interior = 0
+        for x in range(1, map_size + 1):
+            self.interior |= ((1 << map_size) - 1) << (x * width + 1)
+        self.walls = ((1 << (width * width)) - 1) & ~self.interior
+
+        self.snake: Deque[Coordinate] = deque()
+        self.apples: dict[int, Set[Coordinate]] = {RED_APPLE: set(),
+                                                   GREEN_APPLE: set()}
+        self._result = ActionResult(None, None, 0)
+
+        self.reset()
+
+    @property
+    def board(self) -> np.ndarray:
+        """The board as SnakeEnv stores it, built on each access."""
+        board = np.zeros((self.width, self.width), dtype=np.int8)
+        flat = board.reshape(-1)
+        for bitboard, value in ((self.walls, WALL),
+                                (self.body, BODY),
+                                (self.green, GREEN_APPLE),
+                                (self.red, RED_APPLE)):
+            flat[_bit_indexes(bitboard, self.width * self.width)] = value
+        board[self.snake[0]] = HEAD
+        return board
+
+    def get_state(self) -> np.ndarray:
+        return self.board
+
+    def observe(self, interpreter) -> int:
+        """The state `interpreter` sees in this game."""
+        return interpreter.get_state_bitboard(self)
+
+    def reset(self) -> None:
+        """
+        Reset the game state: snake and apples.
+        """
+        self.body = 0
+        self.green = 0
+        self.red = 0
+        self.snake = deque()
+        self.apples = {RED_APPLE: set(), GREEN_APPLE: set()}
+        self._place_snake()
+        self._place_apples(RED_APPLE, self.red_apple_count)
+        self._place_apples(GREEN_APPLE, self.green_apple_count)
+
+    def step(self, copy_board: bool = False) -> ActionResult:
+        """
+        Move the snake one cell in `self.direction`.
+
+        The returned ActionResult is reused by the next call. Its new_state
+        is a board array only when `copy_board` is set.
+        """
+        width = self.width
+        dx, dy = self.direction
+        head_x, head_y = self.snake[0]
+        tail = self.snake[-1]
+        new_head = (head_x + dx, head_y + dy)
+        bit = 1 << ((head_x + dx) * width + head_y + dy)
+
+        if (self.walls | self.body) & bit and new_head != tail:
+            cause = WALL if self.walls & bit else BODY
+            return self._set_result(ActionState.DEAD, False,
+                                    len(self.snake), cause)
+
+        self.snake.appendleft(new_head)
+
+        if not (self.green | self.red) & bit:
+            tail = self.snake.pop()
+            if new_head != tail:
+                self.body ^= 1 << (tail[0] * width + tail[1])
+                self.body |= bit
+
+        elif self.green & bit:
+            self.green ^= bit
+            self.body |= bit
+            self.apples[GREEN_APPLE].remove(new_head)
+            self._place_apples(GREEN_APPLE, 1)
+            return self._set_result(ActionState.EAT_GREEN_APPLE, copy_board,
+                                    len(self.snake))
+
+        else:
+            self.red ^= bit
+            self.body |= bit
+            self.apples[RED_APPLE].remove(new_head)
+            self._place_apples(RED_APPLE, 1)
+            for _ in range(2):
+                if len(self.snake) > 1:
+                    tail = self.snake.pop()
+                    self.body ^= 1 << (tail[0] * width + tail[1])
+                else:
+                    return self._set_result(RED_APPLE, copy_board, 0)
+            return self._set_result(ActionState.EAT_RED_APPLE, copy_board,
+                                    len(self.snake))
+
+        return self._set_result(ActionState.NOTHING, copy_board,
+                                len(self.snake))
+
+    def _set_result(self, action_state, copy_board: bool, snake_length: int,
+                    cause_death: Optional[int] = None) -> ActionResult:
+        result = self._result
+        result.action_state = action_state
+        result.new_state = self.board if copy_board else None
+        result.snake_length = snake_length
+        result.cause_death = cause_death
+        return result
+
+    def _place_snake(self) -> None:
+        """Generate a contiguous snake in a random orientation."""
+        for _ in range(100):
+            points = self._generate_snake_body()
+            if points is not None:
+                self.snake = deque(points)
+                for x, y in points:
+                    self.body |= 1 << (x * self.width + y)
+                head_x, head_y = points[0]
+                neck_x, neck_y = points[1]
+                self.direction = (head_x - neck_x, head_y - neck_y)
+                return
+        raise RuntimeError("Failed to place initial snake after"
+                           " multiple attempts.")
+
+    def _generate_snake_body(self) -> Optional[List[Coordinate]]:
+        x = self.rng.randint(1, self.map_size)
+        y = self.rng.randint(1, self.map_size)
+        path = [(x, y)]
+        used = 1 << (x * self.width + y)
+
+        for _ in range(self.snake_start_length - 1):
+            neighbors = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+            self.rng.shuffle(neighbors)
+            for dx, dy in neighbors:
+                nx, ny = path[-1][0] + dx, path[-1][1] + dy
+                bit = 1 << (nx * self.width + ny)
+                if not (self.walls | used) & bit:
+                    used |= bit
+                    path.append((nx, ny))
+                    break
+            else:
+                return None
+        return path
+
+    def _free_cell(self) -> Optional[Coordinate]:
+        """
+        A uniformly drawn empty cell: random cells are tried first, and the
+        empty cells are only listed when the board is too full for that.
+        """
+        occupied = self.body | self.green | self.red
+        size = self.map_size
+        for _ in range(MAX_REJECTIONS):
+            k = self.rng.randrange(size * size)
+            x, y = k // size + 1, k % size + 1
+            if not (occupied >> (x * self.width + y)) & 1:
+                return x, y
+
+        free = _bit_indexes(self.interior & ~occupied,
+                            self.width * self.width)
+        if len(free) == 0:
+            return None
+        index = int(free[self.rng.randrange(len(free))])
+        return divmod(index, self.width)
+
+    def _place_apples(self, apple_type: int, count: int) -> None:
+        for _ in range(count):
+            pos = self._free_cell()
+            if pos is None:
+                return
+            bit = 1 << (pos[0] * self.width + pos[1])
+            if apple_type == GREEN_APPLE:
+                self.green |= bit
+            else:
+                self.red |= bit
+            self.apples[apple_type].add(pos)
+
+
+def _bit_indexes(bitboard: int, bits: int) -> np.ndarray:
+    """Indexes of the set bits of a non-negative bitboard."""
+    data = np.frombuffer(bitboard.to_bytes((bits + 7) // 8, "little"),
+                         dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder="little")[:bits])
+
+
+BACKENDS = {
+    "array": SnakeEnv,
+    "bitboard": BitboardSnakeEnv,
+}
+
+# Largest map each backend is meant for
+MAX_MAP_SIZES = {
+    "array": 20,
+    "bitboard": 250,
+}
+
+
+def make_env(backend: str, map_size: int, snake_start_length: int = 3,
+             red_apple_count: int = 1, green_apple_count: int = 2,
+             seed: Optional[int] = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown env backend {backend!r}.")
+    return BACKENDS[backend](map_size, snake_start_length, red_apple_count,
+                             green_apple_count, seed=seed)
@@ -0,0 +1,91 @@
+import glob
+import os
+import pickle
+import threading
+from typing import Optional
+
+CHECKPOINT_PATTERN = "checkpoint_*.pkl"
+
+
+def checkpoint_path(directory: str, episode: int) -> str:
+    return os.path.join(directory, f"checkpoint_{episode:010d}.pkl")
+
+
+def list_checkpoints(directory: str) -> list:
+    """Checkpoint files of `directory`, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, CHECKPOINT_PATTERN)))
+
+
+def latest_checkpoint(directory: str) -> Optional[str]:
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class CheckpointWriter:
+    """
+    Write training checkpoints from a background thread.
+
+    `save` only hands the snapshot over and returns at once; if the thread
+    is still writing, the pending snapshot is replaced by the newer one.
+    Every file is written aside and renamed into place, and only the last
+    `keep` checkpoints are kept.
+    """
+
+    def __init__(self, directory: str, keep: int = 3) -> None:
+        if keep < 1:
+            raise ValueError("keep must be at least 1.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.keep = keep
+
+        self._pending: Optional[dict] = None
+        self._closed = False
+        self._error: Optional[Exception] = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, snapshot: dict) -> None:
+        """Queue `snapshot` (must hold a 'global_episode') for writing."""
+        with self._cond:
+            self._pending = snapshot
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Write the pending snapshot, if any, and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self._error is not None:
+            print(f"Error when writing checkpoint : {self._error}")
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                snapshot, self._pending = self._pending, None
+                if snapshot is None:
+                    return
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                self._error = e
+
+    def _write(self, snapshot: dict) -> None:
+        path = checkpoint_path(self.directory, snapshot["global_episode"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
@@ -0,0 +1,64 @@
+from typing import Callable, Optional
+
+from snake.phases import Convergence
+
+
+class ConvergenceMonitor:
+    """
+    Progress of a phase, measured once per window of episodes.
+
+    Progress is `score()`, the mean snake length of greedy evaluation
+    games, or without `score` the mean absolute TD error of the window's
+    updates, divided by `reward_scale` (the largest reward magnitude) and
+    lower being better. The phase has converged once `patience` windows in
+    a row did not beat the best value so far by `min_improvement` of it:
+    the absolute level these reach depends on the rewards and the map, but
+    both stop moving once more episodes no longer help.
+    """
+
+    def __init__(self, config: Convergence,
+                 score: Optional[Callable[[], float]] = None,
+                 reward_scale: float = 1.0) -> None:
+        if config.window < 1:
+            raise ValueError("window must be at least 1.")
+        if config.patience < 1:
+            raise ValueError("patience must be at least 1.")
+        if reward_scale <= 0:
+            raise ValueError("reward_scale must be positive.")
+        self.config = config
+        self.score = score
+        self.reward_scale = reward_scale
+        self.best = None
+        self.stale = 0
+        self.last = None
+        self._episodes = 0
+        self._td_error = 0.0
+        self._td_count = 0
+
+    def end_episode(self, td_error: float, td_count: int) -> bool:
+        """
+        Add an episode's summed absolute TD errors and update count, and
+        tell whether the phase converged, checked at the end of a window.
+        """
+        self._episodes += 1
+        self._td_error += td_error
+        self._td_count += td_count
+        if self._episodes % self.config.window:
+            return False
+
+        td_error = self._td_error / max(self._td_count, 1) / self.reward_scale
+        self._td_error = 0.0
+        self._td_count = 0
+        value = self.score() if self.score is not None else -td_error
+
+        if (self.best is None
+                or value > self.best + self.config.min_improvement
+                * abs(self.best)):
+            self.best = value
+            self.stale = 0
+        else:
+            self.stale += 1
+        self.last = {"td_error": td_error,
+                     "score": value if self.score is not None else None,
+                     "stale": self.stale}
+        return self.stale >= self.config.patience
@@ -1,10 +1,10 @@
-import random
 from collections import deque
 from typing import Deque, List, Optional, Set, Tuple
 
 import numpy as np
 
 from snake.action import ActionResult, ActionState
+from snake.rng import BlockRandom
 
 
 # Cell values
@@ -17,11 +17,56 @@ RED_APPLE = 5
 Coordinate = Tuple[int, int]
 
 
+class FreeCells:
+    """
+    Set of empty cells with O(1) add, remove and uniform sampling.
+
+    Cells are kept in a list, removal swaps the last cell into the freed
+    slot, and a dict maps every cell to its slot.
+    """
+
+    def __init__(self, cells: List[Coordinate]) -> None:
+        self._initial_cells = list(cells)
+        self._initial_index = {cell: i for i, cell in enumerate(cells)}
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __contains__(self, cell: Coordinate) -> bool:
+        return cell in self._index
+
+    def reset(self) -> None:
+        """Mark every cell given at construction as free again."""
+        self._cells = self._initial_cells.copy()
+        self._index = self._initial_index.copy()
+
+    def add(self, cell: Coordinate) -> None:
+        self._index[cell] = len(self._cells)
+        self._cells.append(cell)
+
+    def remove(self, cell: Coordinate) -> None:
+        i = self._index.pop(cell)
+        last = self._cells.pop()
+        if last != cell:
+            self._cells[i] = last
+            self._index[last] = i
+
+    def pop_random(self, rng: BlockRandom) -> Coordinate:
+        """Remove and return a uniformly drawn free cell."""
+        cell = self._cells[rng.randrange(len(self._cells))]
+        self.remove(cell)
+        return cell
+
+
 class SnakeEnv:
     """
     Snake game environment with wall boundaries, apples, and snake movement.
     """
 
+    # Name of the backend in snake.bitboard_env.BACKENDS
+    backend = "array"
+
     def __init__(
             self,
             map_size: int,
@@ -35,23 +80,31 @@ class SnakeEnv:
 
         if snake_start_length < 2:
             raise ValueError("snake_start_length must be at least 2.")
-        random.seed(seed)
+        self.rng = BlockRandom(seed)
         self.map_size = map_size
         self.snake_start_length = snake_start_length
         self.red_apple_count = red_apple_count
         self.green_apple_count = green_apple_count
 
         self.board: np.ndarray = np.zeros((map_size + 2, map_size + 2),
-                                          dtype=int)
+                                          dtype=np.int8)
         self.snake: Deque[Coordinate] = deque()
         self.apples: dict[int, Set[Coordinate]] = {RED_APPLE: set(),
                                                    GREEN_APPLE: set()}
+        self.free_cells = FreeCells([(x, y)
+                                     for x in range(1, map_size + 1)
+                                     for y in range(1, map_size + 1)])
+        self._result = ActionResult(None, None, 0)
 
         self.reset()
 
     def get_state(self) -> np.ndarray:
         return self.board.copy()
 
+    def observe(self, interpreter) -> int:
+        """The state `interpreter` sees in this game."""
+        return interpreter.get_state(self.snake, self.board)
+
     def reset(self) -> None:
         """
         Reset the game state: walls, snake, and apples.x
@@ -64,16 +117,22 @@ class SnakeEnv:
         self._place_apples(RED_APPLE, self.red_apple_count)
         self._place_apples(GREEN_APPLE, self.green_apple_count)
 
-    def step(self) -> ActionResult:
+    def step(self, copy_board: bool = False) -> ActionResult:
+        """
+        Move the snake one cell in `self.direction`.
+
+        The returned ActionResult is reused by the next call. Its new_state
+        is a copy of the board only when `copy_board` is set.
+        """
         dx, dy = self.direction
         head_x, head_y = self.snake[0]
         tail = self.snake[-1]
         new_head = (head_x + dx, head_y + dy)
-        cell = self.board[new_head]
+        cell = int(self.board[new_head])
 
         if cell in (WALL, BODY) and new_head != tail:
-            return ActionResult(ActionState.DEAD, None,
-                                len(self.snake), cell)
+            return self._set_result(ActionState.DEAD, False,
+                                    len(self.snake), cell)
 
         self.snake.appendleft(new_head)
         self.board[head_x, head_y] = BODY
@@ -81,6 +140,8 @@ class SnakeEnv:
         if cell == EMPTY or new_head == tail:
             tail = self.snake.pop()
             if new_head != tail:
+                self.free_cells.remove(new_head)
+                self.free_cells.add(tail)
                 self.board[tail] = EMPTY
             self.board[new_head] = HEAD
 
@@ -88,8 +149,8 @@ class SnakeEnv:
             self.board[new_head] = HEAD
             self.apples[cell].remove(new_head)
             self._place_apples(cell, 1)
-            return ActionResult(ActionState.EAT_GREEN_APPLE,
-                                self.board.copy(), len(self.snake))
+            return self._set_result(ActionState.EAT_GREEN_APPLE, copy_board,
+                                    len(self.snake))
 
         elif cell == RED_APPLE:
             self.board[new_head] = HEAD
@@ -98,14 +159,24 @@ class SnakeEnv:
             for _ in range(2):
                 if len(self.snake) > 1:
                     tail = self.snake.pop()
+                    self.free_cells.add(tail)
                     self.board[tail] = EMPTY
                 else:
-                    return ActionResult(RED_APPLE, self.board.copy(), 0)
-            return ActionResult(ActionState.EAT_RED_APPLE, self.board.copy(),
+                    return self._set_result(RED_APPLE, copy_board, 0)
+            return self._set_result(ActionState.EAT_RED_APPLE, copy_board,
+                                    len(self.snake))
+
+        return self._set_result(ActionState.NOTHING, copy_board,
                                 len(self.snake))
 
-        return ActionResult(ActionState.NOTHING, self.board.copy(),
-                            len(self.snake))
+    def _set_result(self, action_state, copy_board: bool, snake_length: int,
+                    cause_death: Optional[int] = None) -> ActionResult:
+        result = self._result
+        result.action_state = action_state
+        result.new_state = self.board.copy() if copy_board else None
+        result.snake_length = snake_length
+        result.cause_death = cause_death
+        return result
 
     def _init_walls(self) -> None:
         """Initialize the boundary walls."""
@@ -114,6 +185,7 @@ class SnakeEnv:
         self.board[-1, :] = WALL
         self.board[:, 0] = WALL
         self.board[:, -1] = WALL
+        self.free_cells.reset()
 
     def _place_snake(self) -> None:
         """Generate a contiguous snake in a random orientation."""
@@ -123,8 +195,11 @@ class SnakeEnv:
         while attempts < max_attempts:
             try:
                 points = _generate_snake_body(self.board,
-                                              self.snake_start_length)
+                                              self.snake_start_length,
+                                              self.rng)
                 self.snake = deque(points)
+                for point in points:
+                    self.free_cells.remove(point)
                 head_x, head_y = points[0]
                 neck_x, neck_y = points[1]
                 self.direction = (head_x - neck_x, head_y - neck_y)
@@ -135,37 +210,27 @@ class SnakeEnv:
                            " multiple attempts.")
 
     def _place_apples(self, apple_type: int, count: int) -> None:
-        empties = self._available_positions()
-        if count > len(empties):
-            count = len(empties)
+        if count > len(self.free_cells):
+            count = len(self.free_cells)
 
-        for pos in random.sample(empties, count):
-            x, y = pos
-            self.board[x, y] = apple_type
+        for _ in range(count):
+            pos = self.free_cells.pop_random(self.rng)
+            self.board[pos] = apple_type
             self.apples[apple_type].add(pos)
 
-    def _available_positions(self) -> List[Coordinate]:
-        """Return list of empty coordinates inside the boundary."""
-        empties: List[Coordinate] = []
-        for x in range(1, self.map_size + 1):
-            for y in range(1, self.map_size + 1):
-                if self.board[x, y] == EMPTY:
-                    empties.append((x, y))
-        return empties
-
 
 def _generate_snake_body(
-        board: np.ndarray, length: int
+        board: np.ndarray, length: int, rng: BlockRandom
 ) -> List[Coordinate]:
     if length < 1:
         raise ValueError("Length must be at least 1.")
 
     size = board.shape[0]
     # choose random starting cell inside walls
-    x = random.randint(1, size - 2)
-    y = random.randint(1, size - 2)
+    x = rng.randint(1, size - 2)
+    y = rng.randint(1, size - 2)
     if board[x, y] != EMPTY:
-        return _generate_snake_body(board, length)
+        return _generate_snake_body(board, length, rng)
 
     path = [(x, y)]
     board[x, y] = HEAD
@@ -177,7 +242,7 @@ def _generate_snake_body(
             (0, 1),
             (0, -1),
         ]
-        random.shuffle(neighbors)
+        rng.shuffle(neighbors)
         placed = False
         for dx, dy in neighbors:
             nx, ny = path[-1][0] + dx, path[-1][1] + dy
@@ -187,5 +252,7 @@ def _generate_snake_body(
                 placed = True
                 break
         if not placed:
+            for point in path:
+                board[point] = EMPTY
             raise RuntimeError("No space to place the next snake segment.")
     return path
@@ -1,88 +1,237 @@
-import statistics
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
 import numpy as np
 from tqdm import tqdm
 
 from snake.action import index_to_action_tuple, ActionResult, ActionState
 from snake.agent import QLearningSnakeAgent
+from snake.bitboard_env import make_env
 from snake.env import SnakeEnv
 from snake.interpreter import Interpreter
+from snake.recording import ChunkBuilder, RecordingWriter, snapshot
+from snake.rng import spawn_seeds
+from snake.stats import StreamingStats
 
 WALL = 1
 BODY = 3
 
+# Episodes are split into fixed-size shards, each with its own seed, so a
+# run gives the same report whatever the number of workers. Every episode
+# restarts the env stream from its own seed, so it can be recorded and
+# replayed on its own.
+SHARD_EPISODES = 1000
+
+
+@dataclass
+class EvalReport:
+    eat_green_apple: int = 0
+    eat_red_apple: int = 0
+    dead_by_wall: int = 0
+    dead_by_body: int = 0
+    dead_by_size: int = 0
+    stopped: int = 0
+    snake_lengths: StreamingStats = field(default_factory=StreamingStats)
+
+    def merge(self, other: "EvalReport") -> None:
+        self.eat_green_apple += other.eat_green_apple
+        self.eat_red_apple += other.eat_red_apple
+        self.dead_by_wall += other.dead_by_wall
+        self.dead_by_body += other.dead_by_body
+        self.dead_by_size += other.dead_by_size
+        self.stopped += other.stopped
+        self.snake_lengths.merge(other.snake_lengths)
+
+
+_worker = None
+
+
+def _init_worker(model_path: str, map_size: int, max_step: int,
+                 record: bool = False, backend: str = "array"):
+    """Load the model and compile its policy once per process."""
+    global _worker
+    env = make_env(backend, map_size)
+    agent = QLearningSnakeAgent(load_path=model_path, train=False)
+    agent.compile_policy()
+    recorder = ChunkBuilder(len(snapshot(env))) if record else None
+    _worker = (env, agent, Interpreter(), max_step, recorder)
 
-def evaluate(model_path: str,
-             episodes: int = 5000,
-             map_size: int = 10,
-             max_step: int = 2500):
-    eat_green_apple = 0
-    eat_red_apple = 0
-    dead_by_wall = 0
-    dead_by_body = 0
-    dead_by_size = 0
-    stopped = 0
 
-    snake_lengths = []
+def _run_shard(shard: Tuple[int, int]):
+    """Report of the shard, and its recorded chunk when recording."""
+    return _play_shard(*_worker, shard)
 
-    env = SnakeEnv(map_size, 3, 1, 2)
-    agent = QLearningSnakeAgent(load_path=model_path, train=False)
 
-    interpreter = Interpreter()
+def _play_shard(env: SnakeEnv,
+                agent: QLearningSnakeAgent,
+                interpreter: Interpreter,
+                max_step: int,
+                recorder: Optional[ChunkBuilder],
+                shard: Tuple[int, int]):
+    episodes, seed = shard
+    env_seed, agent_seed = spawn_seeds(seed, 2)
+    agent.rng.seed(agent_seed)
+    episode_seeds = np.random.default_rng(env_seed).integers(
+        2 ** 63, size=episodes).tolist()
+
+    report = EvalReport()
 
-    for _ in tqdm(range(episodes), desc="Evaluating Episodes"):
+    for episode_seed in episode_seeds:
+        env.rng.seed(episode_seed)
         env.reset()
+        if recorder is not None:
+            recorder.start_episode(episode_seed, env)
         step = 0
 
         while True:
             if step >= max_step:
-                stopped += 1
+                report.stopped += 1
+                if recorder is not None:
+                    recorder.end_episode(len(env.snake), None)
                 break
 
-            state = interpreter.get_state(env.snake, env.board)
+            state = interpreter.get_env_state(env)
             action_idx = agent.choose_action(state)
+            if recorder is not None:
+                recorder.add_action(action_idx)
             env.direction = index_to_action_tuple(action_idx)
             result: ActionResult = env.step()
 
             if result.action_state == ActionState.EAT_GREEN_APPLE:
-                eat_green_apple += 1
+                report.eat_green_apple += 1
             elif result.action_state == ActionState.EAT_RED_APPLE:
                 if result.snake_length == 0:
-                    dead_by_size += 1
-                    snake_lengths.append(0)
+                    report.dead_by_size += 1
+                    report.snake_lengths.add(0)
                     env.reset()
-                eat_red_apple += 1
+                report.eat_red_apple += 1
 
             if result.action_state == ActionState.DEAD:
                 if result.cause_death == WALL:
-                    dead_by_wall += 1
+                    report.dead_by_wall += 1
                 else:
-                    dead_by_body += 1
+                    report.dead_by_body += 1
 
-                snake_lengths.append(result.snake_length)
+                report.snake_lengths.add(result.snake_length)
+                if recorder is not None:
+                    recorder.end_episode(result.snake_length,
+                                         result.cause_death)
                 env.reset()
                 break
             step += 1
 
+    return report, recorder.take() if recorder is not None else None
+
+
+def _make_shards(episodes: int,
+                 seed: Optional[int]) -> List[Tuple[int, int]]:
+    sizes = [SHARD_EPISODES] * (episodes // SHARD_EPISODES)
+    if episodes % SHARD_EPISODES:
+        sizes.append(episodes % SHARD_EPISODES)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [(size, int(s.generate_state(1)[0]))
+            for size, s in zip(sizes, seeds)]
+
+
+def evaluate_agent(agent: QLearningSnakeAgent,
+                   episodes: int = 5000,
+                   map_size: int = 10,
+                   max_step: int = 2500,
+                   seed: Optional[int] = None,
+                   backend: str = "array") -> EvalReport:
+    """
+    Play `episodes` greedy games with an agent held in memory.
+
+    The episodes and the agent's tie-breaking draws are the ones
+    `evaluate` uses with the same seed: the agent's random stream is
+    reseeded.
+    """
+    env = make_env(backend, map_size)
+    interpreter = Interpreter()
+    report = EvalReport()
+
+    is_train = agent.is_train
+    agent.is_train = False
+    agent.compile_policy()
+    try:
+        for shard in _make_shards(episodes, seed):
+            shard_report, _ = _play_shard(env, agent, interpreter, max_step,
+                                          None, shard)
+            report.merge(shard_report)
+    finally:
+        agent.drop_policy()
+        agent.is_train = is_train
+    return report
+
+
+def evaluate(model_path: str,
+             episodes: int = 5000,
+             map_size: int = 10,
+             max_step: int = 2500,
+             workers: int = 1,
+             seed: Optional[int] = None,
+             record_path: Optional[str] = None,
+             backend: str = "array"):
+    """
+    Play `episodes` games with a model and print their statistics.
+
+    With `record_path`, every episode is appended to that recording, in
+    episode order whatever the number of workers.
+    """
+    shards = _make_shards(episodes, seed)
+    report = EvalReport()
+    init_args = (model_path, map_size, max_step, record_path is not None,
+                 backend)
+    recording = (RecordingWriter(record_path, map_size, backend=backend)
+                 if record_path else None)
+
+    def merge(results):
+        for shard, (shard_report, chunk) in zip(shards, results):
+            report.merge(shard_report)
+            if recording is not None:
+                recording.write_chunk(*chunk)
+            progress.update(shard[0])
+
+    try:
+        with tqdm(total=episodes, desc="Evaluating Episodes") as progress:
+            if workers <= 1:
+                _init_worker(*init_args)
+                merge(map(_run_shard, shards))
+            else:
+                with Pool(workers, initializer=_init_worker,
+                          initargs=init_args) as pool:
+                    merge(pool.imap(_run_shard, shards))
+    finally:
+        if recording is not None:
+            recording.close()
+
+    print_report(report)
+
+
+def print_report(report: EvalReport):
+    snake_lengths = report.snake_lengths
+
     if snake_lengths:
-        min_length = min(snake_lengths)
-        max_length = max(snake_lengths)
-        mean_length = statistics.mean(snake_lengths)
-        median_length = statistics.median(snake_lengths)
-        std_length = statistics.stdev(snake_lengths)\
-            if len(snake_lengths) > 1 else 0
-
-        q1_length = np.percentile(snake_lengths, 25)
-        q3_length = np.percentile(snake_lengths, 75)
+        min_length = snake_lengths.min
+        max_length = snake_lengths.max
+        mean_length = snake_lengths.mean
+        median_length = snake_lengths.median()
+        std_length = snake_lengths.stdev
+
+        q1_length = snake_lengths.quantile(0.25)
+        q3_length = snake_lengths.quantile(0.75)
     else:
         min_length = max_length = mean_length = median_length = std_length = 0
         q1_length = q3_length = 0
 
-    print(f"Eat green apple: {eat_green_apple}")
-    print(f"Eat red apple: {eat_red_apple}")
-    print(f"Dead by wall: {dead_by_wall}")
-    print(f"Dead by body: {dead_by_body}")
-    print(f"Dead by size: {dead_by_size}")
-    print(f"Stopped: {stopped}")
+    print(f"Eat green apple: {report.eat_green_apple}")
+    print(f"Eat red apple: {report.eat_red_apple}")
+    print(f"Dead by wall: {report.dead_by_wall}")
+    print(f"Dead by body: {report.dead_by_body}")
+    print(f"Dead by size: {report.dead_by_size}")
+    print(f"Stopped: {report.stopped}")
     print(f"Min snake length: {min_length}")
     print(f"Max snake length: {max_length}")
     print(f"Mean snake length: {mean_length:.2f}")
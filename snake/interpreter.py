@@ -3,6 +3,31 @@ import numpy as np
 
 from snake.action import ActionResult, ActionState
 
+# A state is 4 danger bits (up, down, left, right) followed by the object
+# seen in each of the 4 directions, packed as one mixed-radix integer.
+DANGER_VALUES = 2
+OBJECT_VALUES = 5
+STATE_RADICES = (DANGER_VALUES,) * 4 + (OBJECT_VALUES,) * 4
+NUM_STATES = DANGER_VALUES ** 4 * OBJECT_VALUES ** 4
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+def encode_state(state: Tuple[int, ...]) -> int:
+    """Pack an 8-value state tuple into its integer code."""
+    code = 0
+    for value, radix in zip(state, STATE_RADICES):
+        code = code * radix + int(value)
+    return code
+
+
+def decode_state(code: int) -> Tuple[int, ...]:
+    """Unpack an integer state code into its 8-value tuple."""
+    state = []
+    for radix in reversed(STATE_RADICES):
+        code, value = divmod(int(code), radix)
+        state.append(value)
+    return tuple(reversed(state))
+
 
 class Interpreter:
     def __init__(
@@ -30,6 +55,25 @@ class Interpreter:
         self.OBJ_WALL = 3
         self.TAIL = 4
 
+        # Object seen for each cell value, built once for the encoders:
+        # an array for get_state_batch and a tuple for get_state.
+        self._snake_cells = (self.HEAD, self.BODY)
+        self._objects = np.full(max(self.WALL, self.HEAD, self.BODY,
+                                    self.GREEN_APPLE, self.RED_APPLE) + 1,
+                                -1, dtype=np.int32)
+        self._objects[self.WALL] = self.OBJ_WALL
+        self._objects[self.HEAD] = self.OBJ_BODY
+        self._objects[self.BODY] = self.OBJ_BODY
+        self._objects[self.GREEN_APPLE] = self.OBJ_GREEN
+        self._objects[self.RED_APPLE] = self.OBJ_RED
+        self._object_codes = tuple(self._objects.tolist())
+
+    @property
+    def reward_scale(self) -> float:
+        """Largest reward magnitude."""
+        return max(abs(self.reward_nothing), abs(self.reward_green_apple),
+                   abs(self.reward_red_apple), abs(self.reward_dead))
+
     def get_reward(self, result: ActionResult) -> float:
         if result.action_state == ActionState.NOTHING:
             return self.reward_nothing
@@ -46,47 +90,151 @@ class Interpreter:
             self,
             snake: Deque[Tuple[int, int]],
             board: np.ndarray
-    ) -> Tuple[int, ...]:
+    ) -> int:
+        """
+        Encode what the snake sees from its head.
+
+        The board already tells snake cells (HEAD or BODY) from the rest,
+        so together with the tail position every body check is a single
+        cell lookup, whatever the length of the snake.
+        """
         head_x, head_y = snake[0]
-        body = set(list(snake)[:-1])
         tail = snake[-1]
-        directions = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+        snake_cells = self._snake_cells
+        objects = self._object_codes
 
-        state = []
+        code = 0
 
-        for dx, dy in directions:
+        for dx, dy in DIRECTIONS:
             nx, ny = head_x + dx, head_y + dy
-            cell = board[ny][nx]
+            cell = board[nx, ny]
             is_wall = (cell == self.WALL)
-            is_body = (nx, ny) in body
-            state.append(int(is_wall or is_body))
-
-        for dx, dy in directions:
-            step = 1
-            while True:
-                x = head_x + dx * step
-                y = head_y + dy * step
-                cell = board[x][y]
-
-                if (x, y) == tail:
-                    obj = self.TAIL
-                    break
-                if (x, y) in body:
-                    obj = self.OBJ_BODY
-                    break
-                elif cell == self.GREEN_APPLE:
-                    obj = self.OBJ_GREEN
-                    break
-                elif cell == self.RED_APPLE:
-                    obj = self.OBJ_RED
-                    break
-                elif cell == self.WALL:
-                    obj = self.OBJ_WALL
-                    break
-                step += 1
-            state.append(obj)
-
-        return tuple(state)
+            is_body = cell in snake_cells and (nx, ny) != tail
+            code = code * DANGER_VALUES + int(is_wall or is_body)
+
+        for dx, dy in DIRECTIONS:
+            x, y = head_x + dx, head_y + dy
+            cell = board[x, y]
+            while cell == self.EMPTY:
+                x += dx
+                y += dy
+                cell = board[x, y]
+
+            if (x, y) == tail:
+                obj = self.TAIL
+            else:
+                obj = objects[int(cell)]
+            code = code * OBJECT_VALUES + obj
+
+        return code
+
+    def get_state_bitboard(self, env) -> int:
+        """
+        get_state for a BitboardSnakeEnv.
+
+        Vertical rays look at the head's column, a contiguous run of bits,
+        and horizontal rays at the occupied bits of the head's row mask;
+        the first hit is the lowest or highest set bit past the head.
+        """
+        width = env.width
+        walls = env.walls
+        body = env.body
+        occupied = walls | body | env.green | env.red
+        head_x, head_y = env.snake[0]
+        tail_x, tail_y = env.snake[-1]
+        head = head_x * width + head_y
+        tail = tail_x * width + tail_y
+        blocked = walls | body
+
+        code = 0
+
+        # up, down, left, right
+        offsets = (-1, 1, -width, width)
+        for offset in offsets:
+            cell = head + offset
+            danger = (blocked >> cell) & 1 and cell != tail
+            code = code * DANGER_VALUES + int(bool(danger))
+
+        column = (occupied >> (head_x * width)) & env.column_mask
+        row = occupied & env.row_masks[head_y]
+        down = column >> (head_y + 1)
+        right = row >> (head + 1)
+        hits = (
+            head_x * width + (column & ((1 << head_y) - 1)).bit_length() - 1,
+            head + (down & -down).bit_length(),
+            (row & ((1 << head) - 1)).bit_length() - 1,
+            head + (right & -right).bit_length(),
+        )
+
+        for cell in hits:
+            if cell == tail:
+                obj = self.TAIL
+            elif (walls >> cell) & 1:
+                obj = self.OBJ_WALL
+            elif (body >> cell) & 1:
+                obj = self.OBJ_BODY
+            elif (env.green >> cell) & 1:
+                obj = self.OBJ_GREEN
+            else:
+                obj = self.OBJ_RED
+            code = code * OBJECT_VALUES + obj
+
+        return code
+
+    def get_env_state(self, env) -> int:
+        """
+        State seen in `env`, whatever its backend: each env class picks
+        the get_state variant that reads its board.
+        """
+        return env.observe(self)
+
+    def get_state_batch(
+            self,
+            boards: np.ndarray,
+            heads: np.ndarray,
+            tails: np.ndarray
+    ) -> np.ndarray:
+        """
+        Encode the states of a stack of boards at once.
+
+        `boards` is (N, size, size) and `heads`/`tails` are (N, 2)
+        coordinates. Each ray is gathered as an (N, size - 1) slice and its
+        first non-empty cell found with an argmax, the wall at the end of
+        every ray guaranteeing a hit. Returns the (N,) state codes, equal to
+        get_state on each board.
+        """
+        boards = np.asarray(boards)
+        heads = np.asarray(heads)
+        tails = np.asarray(tails)
+        n, size = boards.shape[0], boards.shape[1]
+        rows = np.arange(n)
+        head_x, head_y = heads[:, 0], heads[:, 1]
+        tail_x, tail_y = tails[:, 0], tails[:, 1]
+        steps = np.arange(1, size)
+
+        objects = self._objects
+        codes = np.zeros(n, dtype=np.int32)
+
+        for dx, dy in DIRECTIONS:
+            nx, ny = head_x + dx, head_y + dy
+            cell = boards[rows, nx, ny]
+            is_wall = cell == self.WALL
+            is_body = (((cell == self.HEAD) | (cell == self.BODY))
+                       & ((nx != tail_x) | (ny != tail_y)))
+            codes = codes * DANGER_VALUES + (is_wall | is_body)
+
+        for dx, dy in DIRECTIONS:
+            xs = np.clip(head_x[:, np.newaxis] + dx * steps, 0, size - 1)
+            ys = np.clip(head_y[:, np.newaxis] + dy * steps, 0, size - 1)
+            cells = boards[rows[:, np.newaxis], xs, ys]
+            first = (cells != self.EMPTY).argmax(axis=1)
+            hit_x, hit_y = xs[rows, first], ys[rows, first]
+
+            obj = objects[cells[rows, first]]
+            obj[(hit_x == tail_x) & (hit_y == tail_y)] = self.TAIL
+            codes = codes * OBJECT_VALUES + obj
+
+        return codes
 
     def print_vision(self, board: np.ndarray):
         head_pos = np.where(board == self.HEAD)
@@ -1,7 +1,9 @@
 import pygame
 from snake import settings
 import argparse
+from snake.bitboard_env import BACKENDS, MAX_MAP_SIZES
 from snake.eval import evaluate
+from snake.replay import BATCH_SIZE
 from snake.states.game import GameState
 from snake.train import train_model
 from snake.utils.loader import AssetLoader
@@ -21,6 +23,12 @@ class Game:
         self.game = GameState(self, self.settings)
 
     def run(self):
+        try:
+            self._loop()
+        finally:
+            self.game.close()
+
+    def _loop(self):
         while (self.running and
                self.game.nb_sessions <= self.settings["sessions"]):
             dt = self.clock.tick(60) / 1000
@@ -32,8 +40,11 @@ class Game:
                         return
                 self.game.handle_events(event)
             self.game.update(dt)
-            self.game.draw(self.screen)
-            pygame.display.flip()
+            dirty = self.game.draw(self.screen)
+            if dirty is None:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
 
         if self.settings["save_path"]:
             self.game.agent.save_model()
@@ -49,12 +60,43 @@ def validate_args(args):
     if args.eval and args.visual:
         return "Error: Cannot use -eval with -visual"
 
+    if args.trace and not args.visual:
+        return "Error: --trace requires -visual"
+
     if args.eval:
         if not args.load:
             return "Error: --load required for evaluation mode"
 
-    if args.map_size < 5 or args.map_size > 20:
-        return "Error: Map size must be between 5 and 20"
+    if args.visual and args.backend != "array":
+        return "Error: Visual mode only supports the array backend"
+
+    max_map_size = MAX_MAP_SIZES[args.backend]
+    if args.map_size < 5 or args.map_size > max_map_size:
+        return f"Error: Map size must be between 5 and {max_map_size}"
+
+    if args.workers < 1:
+        return "Error: Workers must be at least 1"
+
+    if args.replay is not None and args.replay < BATCH_SIZE:
+        return ("Error: Replay capacity must be at least the batch size "
+                f"({BATCH_SIZE})")
+
+    if args.resume and not args.checkpoint_dir:
+        return "Error: --checkpoint_dir required to resume training"
+
+    if ((args.checkpoint_dir or args.telemetry or args.telemetry_plot)
+            and args.workers > 1):
+        return ("Error: Cannot use checkpoints or telemetry with several "
+                "workers")
+
+    if args.record and args.train and args.workers > 1:
+        return "Error: Cannot record training with several workers"
+
+    if args.record and (args.visual or not (args.train or args.eval)):
+        return "Error: --record requires -train or -eval, without -visual"
+
+    if args.checkpoint_every < 1 or args.checkpoint_keep < 1:
+        return "Error: Checkpoint interval and count must be at least 1"
 
     if (args.sessions is not None and
             (args.sessions < 1 or args.sessions > 999999)):
@@ -75,6 +117,42 @@ if __name__ == "__main__":
                              "'basic', 'intensive', 'optimal'")
     parser.add_argument("--map_size", type=int, default=10,
                         help="Size of the map")
+    parser.add_argument("--backend", type=str, default="array",
+                        choices=tuple(BACKENDS),
+                        help="Board representation of the env. 'bitboard' "
+                             "allows maps up to "
+                             f"{MAX_MAP_SIZES['bitboard']}.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used for evaluation "
+                             "or training.")
+    parser.add_argument("--seed", type=int,
+                        help="Seed for evaluation or training.")
+    parser.add_argument("--replay", type=int,
+                        help="Train from an experience replay buffer of "
+                             "this capacity.")
+    parser.add_argument("--checkpoint_dir", type=str,
+                        help="Directory of periodic training checkpoints.")
+    parser.add_argument("--checkpoint_every", type=int, default=10_000,
+                        help="Episodes between two training checkpoints.")
+    parser.add_argument("--checkpoint_keep", type=int, default=3,
+                        help="Number of training checkpoints to keep.")
+    parser.add_argument("--resume", action='store_true',
+                        help="Resume training from the latest checkpoint "
+                             "of --checkpoint_dir.")
+    parser.add_argument("--telemetry", type=str,
+                        help="JSON-lines file receiving training metrics.")
+    parser.add_argument("-converge", action='store_true',
+                        help="End each training phase early once its "
+                             "greedy games stop improving.")
+    parser.add_argument("-telemetry_plot", action='store_true',
+                        help="Plot training metrics live.")
+    parser.add_argument("--record", type=str,
+                        help="Recording file receiving every training or "
+                             "evaluation episode, replayed with "
+                             "python -m snake.recording.")
+    parser.add_argument("--trace", type=str,
+                        help="Binary file receiving the steps of visual "
+                             "mode, read with python -m snake.trace.")
     parser.add_argument("-train", action='store_true',
                         help="Launch in training mode")
     parser.add_argument("-eval", action='store_true',
@@ -100,14 +178,28 @@ if __name__ == "__main__":
     settings["save_path"] = args.save
     settings["load_path"] = args.load
     settings["sessions"] = args.sessions
+    settings["trace_path"] = args.trace
 
     if args.visual and not args.train and not args.eval:
         Game(settings).run()
     elif args.eval:
         evaluate(settings["load_path"], settings["sessions"],
-                 settings["map_size"])
+                 settings["map_size"], workers=args.workers, seed=args.seed,
+                 record_path=args.record, backend=args.backend)
     elif args.train:
         if args.visual:
             Game(settings).run()
         else:
-            train_model(args.load, args.save, args.sessions, args.phase)
+            train_model(args.load, args.save, args.sessions, args.phase,
+                        workers=args.workers, seed=args.seed,
+                        replay_capacity=args.replay,
+                        checkpoint_dir=args.checkpoint_dir,
+                        checkpoint_every=args.checkpoint_every,
+                        checkpoint_keep=args.checkpoint_keep,
+                        resume=args.resume,
+                        telemetry_path=args.telemetry,
+                        telemetry_plot=args.telemetry_plot,
+                        record_path=args.record,
+                        map_size=args.map_size,
+                        backend=args.backend,
+                        converge=args.converge)
@@ -0,0 +1,81 @@
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from snake.action import Actions
+from snake.interpreter import NUM_STATES, STATE_RADICES
+
+# Binary model layout: a fixed 64-byte header followed by the Q-table as a
+# C-ordered little-endian float64[num_states, num_actions] array, so the
+# table can be opened in place with np.memmap.
+MAGIC = b"L2SQ"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8BII")
+HEADER_SIZE = 64
+DTYPE = np.dtype("<f8")
+
+
+def is_binary_model(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_q_table(path: str, q_table: np.ndarray) -> None:
+    num_states, num_actions = q_table.shape
+    header = HEADER.pack(MAGIC, VERSION, len(STATE_RADICES),
+                         *STATE_RADICES, num_states, num_actions)
+
+    # Write aside then rename, so processes that have the previous file
+    # mapped keep reading a complete table.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(q_table, dtype=DTYPE).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_q_table(path: str) -> np.ndarray:
+    """
+    Open a binary model without reading it.
+
+    The table is a read-only memmap, shared through the page cache by every
+    process opening the same file.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a binary model.")
+
+    (_, version, radix_count, *radices,
+     num_states, num_actions) = HEADER.unpack(header)
+    if version != VERSION:
+        raise ValueError(f"Unsupported model version {version}.")
+    if (tuple(radices[:radix_count]) != STATE_RADICES
+            or num_states != NUM_STATES):
+        raise ValueError("Model was saved with another state encoding.")
+    if num_actions != len(Actions):
+        raise ValueError(f"Model has {num_actions} actions, expected "
+                         f"{len(Actions)}.")
+
+    return np.memmap(path, dtype=DTYPE, mode="r",
+                     offset=HEADER_SIZE, shape=(num_states, num_actions))
+
+
+def main():
+    from snake.agent import read_q_table
+
+    parser = argparse.ArgumentParser(
+        description="Convert a pickled model to the binary model format.")
+    parser.add_argument("source", type=str, help="Pickled model to read")
+    parser.add_argument("target", type=str, help="Binary model to write")
+    args = parser.parse_args()
+
+    save_q_table(args.target, read_q_table(args.source))
+    print(f"Model converted to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,25 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import List, Optional
+
+
+@dataclass
+class Convergence:
+    """
+    A phase ends early once its progress, measured every `window`
+    episodes, failed `patience` windows in a row to beat its best so far
+    by `min_improvement` of it (see snake.convergence).
+
+    Progress is the mean snake length of `eval_episodes` greedy games
+    played from the same seeds every window, stopped after
+    `eval_max_steps` steps. With `eval_episodes` at 0 it is the mean TD
+    error instead, which costs nothing but flattens out as soon as the
+    exploration rate is low, long before the games stop improving.
+    """
+    window: int = 5_000
+    patience: int = 5
+    min_improvement: float = 0.01
+    eval_episodes: int = 200
+    eval_max_steps: int = 1_000
 
 
 @dataclass
@@ -7,6 +28,7 @@ class PhaseConfig:
     episodes: int
     eps_start: float = 0.0
     eps_end: float = 0.0
+    convergence: Optional[Convergence] = None
 
 
 basic_cfg = [
@@ -126,3 +148,16 @@ def get_standard_phases_cfg(episodes: int):
             eps_end=0.01,
         )
     ]
+
+
+def with_convergence(phases: List[PhaseConfig],
+                     config: Optional[Convergence] = None
+                     ) -> List[PhaseConfig]:
+    """
+    `phases` ending early once they have converged: phases without a
+    convergence config of their own get `config`.
+    """
+    config = config or Convergence()
+    return [phase if phase.convergence is not None
+            else replace(phase, convergence=config)
+            for phase in phases]
@@ -0,0 +1,306 @@
+import argparse
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from snake.action import ActionState, index_to_action_tuple
+from snake.bitboard_env import make_env
+from snake.env import GREEN_APPLE, RED_APPLE, SnakeEnv
+
+# Recording layout: a fixed 32-byte header giving the env parameters and
+# backend (an index in ENV_BACKENDS, 0 in files written before it), then
+# chunks appended one after the other. A chunk is a (episodes, data size)
+# header, the index record of each episode, then the packed actions of
+# its episodes. Readers load the indexes only and seek to the actions.
+MAGIC = b"L2SR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHHHB")
+HEADER_SIZE = 32
+CHUNK_HEADER = struct.Struct("<II")
+ENV_BACKENDS = ("array", "bitboard")
+
+# Cause of the end of an episode, as in ActionResult.cause_death
+STOPPED = 0
+WALL = 1
+BODY = 3
+
+
+def index_dtype(cells: int) -> np.dtype:
+    """Index record of an episode whose initial snapshot has `cells`."""
+    return np.dtype([("seed", "<u8"),
+                     ("offset", "<u4"),
+                     ("steps", "<u4"),
+                     ("length", "<u2"),
+                     ("cause", "u1"),
+                     ("snapshot", "u1", (cells, 2))])
+
+
+def pack_actions(actions: bytes) -> bytes:
+    """Pack action indexes (0 to 3) four per byte."""
+    actions = np.frombuffer(actions, dtype=np.uint8)
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = actions
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | quads[:, 1] << 2
+            | quads[:, 2] << 4 | quads[:, 3] << 6).tobytes()
+
+
+def unpack_actions(data: bytes, steps: int) -> np.ndarray:
+    packed = np.frombuffer(data, dtype=np.uint8)
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    return ((packed[:, None] >> shifts) & 3).ravel()[:steps]
+
+
+def snapshot(env: SnakeEnv) -> List[Tuple[int, int]]:
+    """Snake cells, head first, then red and green apples."""
+    return (list(env.snake)
+            + sorted(env.apples[RED_APPLE])
+            + sorted(env.apples[GREEN_APPLE]))
+
+
+def reseed_episode(env: SnakeEnv) -> int:
+    """Restart the env stream from a seed drawn from it, and return it."""
+    seed = int(env.rng.generator.integers(2 ** 63))
+    env.rng.seed(seed)
+    return seed
+
+
+class ChunkBuilder:
+    """
+    Episodes being recorded, kept in memory until taken as one chunk.
+
+    An episode is the seed its env stream was restarted from before
+    `env.reset()`, a snapshot of the reset env, and its actions. Replaying
+    the actions on an env reset from the same seed gives the same game.
+    """
+
+    def __init__(self, cells: int) -> None:
+        self.dtype = index_dtype(cells)
+        self._index = []
+        self._data = bytearray()
+        self._actions = bytearray()
+        self._episode = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def start_episode(self, seed: int, env: SnakeEnv) -> None:
+        self._episode = (seed, snapshot(env))
+        self._actions.clear()
+
+    def add_action(self, action: int) -> None:
+        self._actions.append(action)
+
+    def end_episode(self, length: int, cause: Optional[int]) -> None:
+        seed, cells = self._episode
+        self._index.append((seed, len(self._data), len(self._actions),
+                            length, cause or STOPPED, cells))
+        self._data += pack_actions(self._actions)
+        self._episode = None
+
+    def take(self) -> Tuple[np.ndarray, bytes]:
+        """Index and packed actions of the recorded episodes, then clear."""
+        index = np.array(self._index, dtype=self.dtype)
+        data = bytes(self._data)
+        self._index = []
+        self._data = bytearray()
+        return index, data
+
+
+class RecordingWriter:
+    """
+    Append recorded episodes to a file, `chunk_episodes` at a time.
+
+    An existing file is appended to, if it was written for the same env
+    parameters.
+    """
+
+    def __init__(self, path: str, map_size: int,
+                 snake_start_length: int = 3,
+                 red_apple_count: int = 1,
+                 green_apple_count: int = 2,
+                 chunk_episodes: int = 4096,
+                 backend: str = "array") -> None:
+        if chunk_episodes < 1:
+            raise ValueError("chunk_episodes must be at least 1.")
+        self.path = path
+        self.chunk_episodes = chunk_episodes
+        self.cells = snake_start_length + red_apple_count + green_apple_count
+        self.builder = ChunkBuilder(self.cells)
+
+        header = HEADER.pack(MAGIC, VERSION, map_size, snake_start_length,
+                             red_apple_count, green_apple_count,
+                             ENV_BACKENDS.index(backend))
+        header = header.ljust(HEADER_SIZE, b"\0")
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(HEADER_SIZE) != header:
+                    raise ValueError(f"{path} was recorded with other env "
+                                     "parameters.")
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(header)
+
+    def start_episode(self, seed: int, env: SnakeEnv) -> None:
+        self.builder.start_episode(seed, env)
+
+    def add_action(self, action: int) -> None:
+        self.builder.add_action(action)
+
+    def end_episode(self, length: int, cause: Optional[int]) -> None:
+        self.builder.end_episode(length, cause)
+        if len(self.builder) >= self.chunk_episodes:
+            self.flush()
+
+    def write_chunk(self, index: np.ndarray, data: bytes) -> None:
+        if len(index) == 0:
+            return
+        self._file.write(CHUNK_HEADER.pack(len(index), len(data)))
+        self._file.write(index.tobytes())
+        self._file.write(data)
+
+    def flush(self) -> None:
+        self.write_chunk(*self.builder.take())
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class RecordingReader:
+    """
+    Index of every episode of a recording, with their actions read on
+    demand.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a recording.")
+            (_, version, self.map_size, self.snake_start_length,
+             self.red_apple_count,
+             self.green_apple_count,
+             backend) = HEADER.unpack(header[:HEADER.size])
+            if version != VERSION:
+                raise ValueError(f"Unsupported recording version {version}.")
+            if backend >= len(ENV_BACKENDS):
+                raise ValueError(f"Unknown env backend {backend} in {path}.")
+            self.backend = ENV_BACKENDS[backend]
+
+            dtype = index_dtype(self.snake_start_length
+                                + self.red_apple_count
+                                + self.green_apple_count)
+            indexes, positions = [], []
+            while True:
+                chunk_header = f.read(CHUNK_HEADER.size)
+                if len(chunk_header) < CHUNK_HEADER.size:
+                    break
+                episodes, data_size = CHUNK_HEADER.unpack(chunk_header)
+                index = np.frombuffer(f.read(episodes * dtype.itemsize),
+                                      dtype=dtype)
+                positions.append(f.tell() + index["offset"].astype(np.int64))
+                indexes.append(index)
+                f.seek(data_size, os.SEEK_CUR)
+
+        self.index = (np.concatenate(indexes) if indexes
+                      else np.zeros(0, dtype=dtype))
+        self._positions = (np.concatenate(positions) if positions
+                           else np.zeros(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def actions(self, episode: int) -> np.ndarray:
+        steps = int(self.index["steps"][episode])
+        with open(self.path, "rb") as f:
+            f.seek(int(self._positions[episode]))
+            data = f.read(-(-steps // 4))
+        return unpack_actions(data, steps)
+
+    def worst(self, count: int) -> np.ndarray:
+        """Episodes with the shortest final length, worst first."""
+        return np.argsort(self.index["length"], kind="stable")[:count]
+
+    def replay(self, episode: int) -> Iterator[SnakeEnv]:
+        """Yield the env at the start of `episode` and after every move."""
+        record = self.index[episode]
+        env = make_env(self.backend, self.map_size, self.snake_start_length,
+                       self.red_apple_count, self.green_apple_count)
+        env.rng.seed(int(record["seed"]))
+        env.reset()
+        if snapshot(env) != [tuple(cell) for cell in
+                             record["snapshot"].tolist()]:
+            raise ValueError(f"Episode {episode} does not replay from its "
+                             "seed.")
+        yield env
+
+        for action in self.actions(episode).tolist():
+            env.direction = index_to_action_tuple(action)
+            result = env.step()
+            if result.action_state == ActionState.DEAD:
+                return
+            yield env
+
+
+def render_episode(reader: RecordingReader, episode: int, path: str,
+                   cell_size: int = 24, fmt: str = "gif") -> None:
+    from snake.render import OffscreenRenderer, save_frames
+
+    steps = int(reader.index["steps"][episode])
+    renderer = OffscreenRenderer(reader.map_size, cell_size, steps + 1)
+    for env in reader.replay(episode):
+        renderer.capture(env)
+    save_frames(renderer.episode_frames(), path, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List or render the episodes of a recording.")
+    parser.add_argument("path", type=str, help="Recording file")
+    parser.add_argument("--index", type=int, nargs="+",
+                        help="Episodes to render")
+    parser.add_argument("--worst", type=int,
+                        help="Render this many shortest episodes")
+    parser.add_argument("--out", type=str, default="replays",
+                        help="Output directory")
+    parser.add_argument("--cell_size", type=int, default=24,
+                        help="Size of a cell in pixels")
+    parser.add_argument("--format", type=str, default="gif",
+                        choices=("gif", "png"),
+                        help="Animated GIF or PNG sequence per episode")
+    args = parser.parse_args()
+
+    reader = RecordingReader(args.path)
+    episodes = list(args.index or [])
+    if args.worst:
+        episodes.extend(reader.worst(args.worst).tolist())
+
+    if not episodes:
+        lengths = reader.index["length"]
+        print(f"Episodes: {len(reader)}")
+        if len(reader):
+            print(f"Mean length: {lengths.mean():.2f}")
+            print(f"Min/max length: {lengths.min()}/{lengths.max()}")
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    for episode in episodes:
+        record = reader.index[episode]
+        name = f"episode_{episode:08d}" + (".gif" if args.format == "gif"
+                                           else "")
+        path = os.path.join(args.out, name)
+        render_episode(reader, episode, path, args.cell_size, args.format)
+        print(f"Episode {episode} (length {record['length']}, "
+              f"{record['steps']} steps) saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import os
+from typing import List, Optional
+
+import numpy as np
+import pygame
+
+from snake.action import ActionState, index_to_action_tuple
+from snake.agent import QLearningSnakeAgent
+from snake.env import GREEN_APPLE, RED_APPLE, SnakeEnv
+from snake.interpreter import Interpreter
+from snake.ui.sprites import SnakeSprites, build_board_surface
+from snake.utils.loader import AssetLoader
+
+# Frames allocated before the buffer first grows
+INITIAL_FRAMES = 16
+
+
+class OffscreenRenderer:
+    """
+    Draw SnakeEnv states into NumPy frames, without a display.
+
+    Frames are (height, width, 3) uint8 images written into a buffer
+    reused from one episode to the next. The buffer doubles when an episode
+    fills it, up to `capacity` frames, so it only grows as large as the
+    longest episode.
+    """
+
+    def __init__(self, map_size: int, cell_size: int = 24,
+                 capacity: int = 1024) -> None:
+        self.map_size = map_size
+        self.cell_size = cell_size
+        self.size = map_size * cell_size
+
+        self.sprites = SnakeSprites(AssetLoader(), cell_size)
+        self.board_surface = build_board_surface(map_size, cell_size)
+        self.surface = pygame.Surface((self.size, self.size))
+
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self.capacity = capacity
+        self.frames = np.zeros((min(capacity, INITIAL_FRAMES), self.size,
+                                self.size, 3), dtype=np.uint8)
+        self.count = 0
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def draw(self, env: SnakeEnv) -> pygame.Surface:
+        surface = self.surface
+        surface.blit(self.board_surface, (0, 0))
+        self.sprites.draw_apples(surface, "RED_APPLE",
+                                 env.apples[RED_APPLE], 0, 0)
+        self.sprites.draw_apples(surface, "GREEN_APPLE",
+                                 env.apples[GREEN_APPLE], 0, 0)
+        self.sprites.draw_snake(surface, env.snake, env.direction, 0, 0)
+        return surface
+
+    def capture(self, env: SnakeEnv) -> np.ndarray:
+        """Draw `env` into the next frame of the buffer and return it."""
+        if self.count == len(self.frames):
+            if self.count == self.capacity:
+                raise RuntimeError("Frame buffer is full.")
+            self._grow(min(2 * self.count, self.capacity))
+        pixels = pygame.surfarray.pixels3d(self.draw(env))
+        frame = self.frames[self.count]
+        frame[...] = pixels.transpose(1, 0, 2)
+        del pixels
+        self.count += 1
+        return frame
+
+    def _grow(self, frames: int) -> None:
+        grown = np.zeros((frames,) + self.frames.shape[1:], dtype=np.uint8)
+        grown[:self.count] = self.frames[:self.count]
+        self.frames = grown
+
+    def episode_frames(self) -> np.ndarray:
+        return self.frames[:self.count]
+
+
+def save_frames(frames: np.ndarray, path: str, fmt: str = "gif",
+                fps: int = 15) -> None:
+    """Write frames as an animated GIF, or as a directory of PNG files."""
+    from PIL import Image
+
+    if fmt == "gif":
+        # Frames are converted as the GIF is written, not all up front
+        Image.fromarray(frames[0]).save(
+            path, save_all=True,
+            append_images=(Image.fromarray(frame) for frame in frames[1:]),
+            duration=1000 // fps, loop=0)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for i, frame in enumerate(frames):
+            Image.fromarray(frame).save(os.path.join(path, f"{i:05d}.png"))
+
+
+def record_episodes(model_path: str,
+                    episodes: int,
+                    out_dir: str,
+                    map_size: int = 10,
+                    max_steps: int = 500,
+                    cell_size: int = 24,
+                    fmt: str = "gif",
+                    seed: Optional[int] = None) -> List[str]:
+    """Play `episodes` games with a model and save each one."""
+    env = SnakeEnv(map_size, 3, 1, 2, seed=seed)
+    agent = QLearningSnakeAgent(load_path=model_path, train=False, seed=seed)
+    agent.compile_policy()
+    interpreter = Interpreter()
+    renderer = OffscreenRenderer(map_size, cell_size, max_steps + 1)
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for episode in range(episodes):
+        env.reset()
+        renderer.clear()
+        renderer.capture(env)
+
+        for _ in range(max_steps):
+            state = interpreter.get_state(env.snake, env.board)
+            env.direction = index_to_action_tuple(agent.choose_action(state))
+            result = env.step()
+            if (result.action_state == ActionState.DEAD
+                    or result.snake_length < 1):
+                break
+            renderer.capture(env)
+
+        name = f"episode_{episode:04d}" + (".gif" if fmt == "gif" else "")
+        path = os.path.join(out_dir, name)
+        save_frames(renderer.episode_frames(), path, fmt)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record episodes of a model without opening a window.")
+    parser.add_argument("--load", type=str, required=True,
+                        help="Model to play")
+    parser.add_argument("--out", type=str, default="recordings",
+                        help="Output directory")
+    parser.add_argument("--episodes", type=int, default=1,
+                        help="Number of episodes to record")
+    parser.add_argument("--map_size", type=int, default=10,
+                        help="Size of the map")
+    parser.add_argument("--max_steps", type=int, default=500,
+                        help="Maximum steps per episode")
+    parser.add_argument("--cell_size", type=int, default=24,
+                        help="Size of a cell in pixels")
+    parser.add_argument("--format", type=str, default="gif",
+                        choices=("gif", "png"),
+                        help="Animated GIF or PNG sequence per episode")
+    parser.add_argument("--seed", type=int, help="Seed of the episodes")
+    args = parser.parse_args()
+
+    for path in record_episodes(args.load, args.episodes, args.out,
+                                args.map_size, args.max_steps,
+                                args.cell_size, args.format, args.seed):
+        print(f"Episode saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Transitions per minibatch, unless told otherwise
+BATCH_SIZE = 64
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity ring buffer of (state, action, reward, next_state, done)
+    transitions stored in preallocated typed arrays.
+
+    Once full, every new transition overwrites the oldest one.
+    """
+
+    def __init__(self, capacity: int, batch_size: int = BATCH_SIZE,
+                 seed: Optional[int] = None) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+
+        # Minibatches are only drawn from a buffer holding a batch, so a
+        # smaller one would never be learned from.
+        if capacity < batch_size:
+            raise ValueError("capacity must be at least batch_size.")
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int32)
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        self._pos = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, state: int, action: int, reward: float,
+            next_state: int, done: bool) -> None:
+        i = self._pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self._pos = (i + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def sample(self, batch_size: Optional[int] = None) -> Tuple[np.ndarray,
+                                                                ...]:
+        """Draw a minibatch uniformly, with replacement."""
+        if batch_size is None:
+            batch_size = self.batch_size
+        idx = self.rng.integers(0, self._size, size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
@@ -0,0 +1,51 @@
+from typing import MutableSequence, Optional
+
+import numpy as np
+
+
+class BlockRandom:
+    """
+    Random draws served from blocks pre-generated by a NumPy Generator.
+
+    Uniform floats are drawn `block_size` at a time and handed out one by
+    one, so a draw on the hot path is a list lookup instead of a call into
+    the generator. Each env and agent owns one, which makes every run
+    reproducible from its seed, independently of any other object.
+    """
+
+    def __init__(self, seed=None, block_size: int = 4096) -> None:
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None) -> None:
+        """Restart the stream from `seed` (an int or a SeedSequence)."""
+        self.generator = np.random.default_rng(seed)
+        self._block = []
+        self._pos = 0
+
+    def random(self) -> float:
+        """Uniform float in [0, 1)."""
+        if self._pos == len(self._block):
+            self._block = self.generator.random(self.block_size).tolist()
+            self._pos = 0
+        u = self._block[self._pos]
+        self._pos += 1
+        return u
+
+    def randrange(self, n: int) -> int:
+        """Uniform int in [0, n)."""
+        return int(self.random() * n)
+
+    def randint(self, a: int, b: int) -> int:
+        """Uniform int in [a, b]."""
+        return a + self.randrange(b - a + 1)
+
+    def shuffle(self, seq: MutableSequence) -> None:
+        for i in range(len(seq) - 1, 0, -1):
+            j = self.randrange(i + 1)
+            seq[i], seq[j] = seq[j], seq[i]
+
+
+def spawn_seeds(seed: Optional[int], count: int) -> list:
+    """Independent child seeds of `seed`, one per object to seed."""
+    return np.random.SeedSequence(seed).spawn(count)
@@ -24,4 +24,5 @@ settings_value = {
     "load_path": None,
     "save_path": None,
     "sessions": 0,
+    "trace_path": None,
 }
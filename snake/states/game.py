@@ -1,16 +1,18 @@
+from time import perf_counter
 from typing import Tuple, Deque, Set
 
 import pygame
 
-from snake.action import (index_to_string,
-                          ActionResult,
+from snake.action import (ActionResult,
                           ActionState,
                           index_to_action_tuple)
 from snake.agent import QLearningSnakeAgent
 from snake.env import SnakeEnv
-from snake.interpreter import Interpreter
+from snake.interpreter import Interpreter, decode_state
 from snake.states.base_state import BaseState
+from snake.trace import TraceRecorder
 from snake.ui.animated_background import AnimatedGridBackground
+from snake.ui.sprites import SnakeSprites, build_board_surface
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -24,6 +26,12 @@ HEAD = 2
 BODY = 3
 GREEN_APPLE = 4
 RED_APPLE = 5
+MAX_STEPS = 500
+# Simulation speeds cycled with F: multiples of snake_speed, or 0 to run
+# as many steps as fit in FAST_FRAME_BUDGET seconds every frame. Max speed
+# trades frame rate for throughput: drawing a frame costs a few ms
+SPEEDS = (1, 10, 0)
+FAST_FRAME_BUDGET = 1 / 20
 Coordinate = Tuple[int, int]
 
 
@@ -57,6 +65,8 @@ class GameState(BaseState):
                                          load_path=self.settings["load_path"],
                                          train=self.settings["train"])
         self.agent.calc_eps_decay(self.settings["sessions"])
+        if not self.settings["train"]:
+            self.agent.compile_policy()
         self.current_state = self.interpreter.get_state(self.env.snake,
                                                         self.env.board)
 
@@ -69,55 +79,46 @@ class GameState(BaseState):
         self._step_by_step = settings["step"]
         self._end_game = False
         self._nb_steps = 0
+        self._speed_idx = 0
+        self.trace = TraceRecorder(self.settings.get("trace_path"))
+
+        self.sprites = SnakeSprites(self.game.loader, self.cell_size)
+        self.snake_head_sprites = self.sprites.head
+        self.snake_tail_sprites = self.sprites.tail
+        self.snake_body_sprites = self.sprites.body
+        self.snake_angle_body_sprites = self.sprites.angle_body
+        self.apple_sprites = self.sprites.apples
+
+        # Incremental rendering: the board, apples and snake are kept on
+        # their own layer, and only the cells whose sprite changed since
+        # the last frame are redrawn, on the layer and on the screen. The
+        # animated background is only redrawn around the board, and a
+        # text only over its old and new rects.
+        self.board_layer = self.board_surface.copy()
+        self._drawn_cells = {}
+        self._scene_changed = True
+        self._full_redraw = True
+        self._background_changed = False
+        self._texts = {}
+        self._text_positions = {"score": (10, 10),
+                                "session": (10, 30),
+                                "speed": (10, 50)}
+        self._drawn_texts = {}
+        self._text_rects = {}
+        self._drawn_state = None
+        self._background_rects = self._around_board()
 
-        def scale(img):
-            return pygame.transform.scale(img, (self.cell_size,
-                                                self.cell_size))
-
-        self.snake_head_sprites = {
-            (-1, 0): scale(self.game.loader.load_image("L_HEAD.png")),
-            (1, 0): scale(self.game.loader.load_image("R_HEAD.png")),
-            (0, -1): scale(self.game.loader.load_image("U_HEAD.png")),
-            (0, 1): scale(self.game.loader.load_image("D_HEAD.png")),
-        }
-
-        self.snake_tail_sprites = {
-            (-1, 0): scale(self.game.loader.load_image("R_TAIL.png")),
-            (1, 0): scale(self.game.loader.load_image("L_TAIL.png")),
-            (0, -1): scale(self.game.loader.load_image("D_TAIL.png")),
-            (0, 1): scale(self.game.loader.load_image("U_TAIL.png")),
-        }
-
-        self.snake_body_sprites = {
-            "v": scale(self.game.loader.load_image("U-D_BODY.png")),
-            "h": scale(self.game.loader.load_image("L-R_BODY.png")),
-        }
-
-        self.snake_angle_body_sprites = {
-            ((-1, 0), (0, -1)): scale(
-                self.game.loader.load_image("U-L_BODY.png")),
-            ((0, -1), (-1, 0)): scale(
-                self.game.loader.load_image("U-L_BODY.png")),
-            ((-1, 0), (0, 1)):  scale(
-                self.game.loader.load_image("D-L_BODY.png")),
-            ((0, 1), (-1, 0)):  scale(
-                self.game.loader.load_image("D-L_BODY.png")),
-            ((1, 0), (0, -1)):  scale(
-                self.game.loader.load_image("U-R_BODY.png")),
-            ((0, -1), (1, 0)):  scale(
-                self.game.loader.load_image("U-R_BODY.png")),
-            ((1, 0), (0, 1)):   scale(
-                self.game.loader.load_image("D-R_BODY.png")),
-            ((0, 1), (1, 0)):   scale(
-                self.game.loader.load_image("D-R_BODY.png")),
-        }
-
-        self.apple_sprites = {
-            "RED_APPLE": scale(
-                self.game.loader.load_image("red_apple.png")),
-            "GREEN_APPLE": scale(
-                self.game.loader.load_image("green_apple.png")),
+        state_size = 30
+        self._panel_size = state_size
+        self._panel_sprites = {
+            self.interpreter.OBJ_GREEN: self.apple_sprites["GREEN_APPLE"],
+            self.interpreter.OBJ_RED: self.apple_sprites["RED_APPLE"],
+            self.interpreter.OBJ_BODY: self.snake_body_sprites["h"],
+            self.interpreter.TAIL: self.snake_tail_sprites[(0, 1)],
         }
+        for obj, sprite in self._panel_sprites.items():
+            self._panel_sprites[obj] = pygame.transform.scale(
+                sprite, (state_size, state_size))
 
     def set_grid_size(self, new_size):
         self.grid_size = new_size
@@ -134,83 +135,77 @@ class GameState(BaseState):
                    surface,
                    snake: Deque[Coordinate],
                    head_dir: Coordinate):
-        for i, (col, row) in enumerate(snake):
-            x = self.board_x + (col - 1) * self.cell_size
-            y = self.board_y + (row - 1) * self.cell_size
-
-            if i == 0:
-                # head
-                sprite = self.snake_head_sprites[head_dir]
-
-            elif i == len(snake) - 1:
-                # tail
-                prev_col, prev_row = snake[-2]
-                tail_col, tail_row = snake[-1]
-                tail_dir = (tail_col - prev_col, tail_row - prev_row)
-                sprite = self.snake_tail_sprites[tail_dir]
-
-            else:
-                # body
-                before = snake[i - 1]
-                curr = snake[i]
-                after = snake[i + 1]
-                sprite = self.get_body_sprite(before, curr, after)
-
-            surface.blit(sprite, (x, y))
+        self.sprites.draw_snake(surface, snake, head_dir,
+                                self.board_x, self.board_y)
 
     def get_body_sprite(self,
                         head: Coordinate,
                         body: Coordinate,
                         tail: Coordinate):
-        din = (head[0] - body[0], head[1] - body[1])
-        dout = (tail[0] - body[0], tail[1] - body[1])
+        return self.sprites.body_sprite(head, body, tail)
+
+    def draw_apples(self, surface, apple_type, apple: Set[Coordinate]):
+        self.sprites.draw_apples(surface, apple_type, apple,
+                                 self.board_x, self.board_y)
 
-        if din == dout or din == (-dout[0], -dout[1]):
-            if din[1] != 0:
-                return self.snake_body_sprites["v"]
-            else:
-                return self.snake_body_sprites["h"]
+    def render_text(self, slot, text, color=WHITE):
+        """Text surface of `slot`, rendered again only when text changes."""
+        cached = self._texts.get(slot)
+        if cached is None or cached[0] != text:
+            cached = (text, self.font.render(text, True, color))
+            self._texts[slot] = cached
+        return cached[1]
 
-        return self.snake_angle_body_sprites.get(
-            (din, dout), pygame.Surface((self.cell_size, self.cell_size)))
+    def score_text(self):
+        return f"Snake length: {len(self.env.snake)}"
 
-    def draw_apples(self, surface, apple_type, apple: Set[Coordinate]):
-        sprite = self.apple_sprites[apple_type]
+    def session_text(self):
+        return (f"Session: {self.nb_sessions}"
+                + (f"/{self.settings['sessions']}"
+                   if self.settings['sessions'] > 0 else ""))
 
-        for (x, y) in apple:
-            x = self.board_x + (x - 1) * self.cell_size
-            y = self.board_y + (y - 1) * self.cell_size
-            surface.blit(sprite, (x, y))
+    def text_rect(self, slot, text):
+        return self.render_text(slot, text).get_rect(
+            topleft=self._text_positions[slot])
 
     def draw_score(self, surface):
-        snake_len = len(self.env.snake)
-        score_text = f"Snake length: {snake_len}"
-        score_surface = self.font.render(score_text, True, WHITE)
-        score_rect = score_surface.get_rect(topleft=(10, 10))
+        score_surface = self.render_text("score", self.score_text())
+        score_rect = score_surface.get_rect(
+            topleft=self._text_positions["score"])
         surface.blit(score_surface, score_rect)
+        return score_rect
 
     def draw_session_info(self, surface):
-        session_text = (f"Session: {self.nb_sessions}"
-                        + (f"/{self.settings['sessions']}"
-                           if self.settings['sessions'] > 0 else ""))
-        session_surface = self.font.render(session_text, True, WHITE)
-        session_rect = session_surface.get_rect(topleft=(10, 30))
+        session_surface = self.render_text("session", self.session_text())
+        session_rect = session_surface.get_rect(
+            topleft=self._text_positions["session"])
         surface.blit(session_surface, session_rect)
+        return session_rect
+
+    def speed_text(self):
+        speed = SPEEDS[self._speed_idx]
+        return f"Speed: {speed}x" if speed else "Speed: max"
+
+    def draw_speed(self, surface):
+        speed_surface = self.render_text("speed", self.speed_text())
+        speed_rect = speed_surface.get_rect(
+            topleft=self._text_positions["speed"])
+        surface.blit(speed_surface, speed_rect)
+        return speed_rect
 
     def draw_end_screen(self, surface):
-        score_text = f"Snake length: {len(self.env.snake)}"
-        score_surface = self.font.render(score_text, True, WHITE)
+        score_surface = self.render_text("score", self.score_text())
         score_rect = score_surface.get_rect(center=(1080 // 2, 720 // 2))
         surface.blit(score_surface, score_rect)
 
     def draw_state(self, surface):
-        state = self.interpreter.get_state(self.env.snake, self.env.board)
-
+        """Draw the vision panel of the current state, return its cells."""
         (danger_up, danger_down,
          danger_left, danger_right,
-         obj_up, obj_down, obj_left, obj_right) = state
+         obj_up, obj_down, obj_left, obj_right) = decode_state(
+            self.current_state)
 
-        state_size = 30
+        state_size = self._panel_size
         state_x = 1080 - state_size * 3
         state_y = 720 - state_size * 3
 
@@ -224,46 +219,35 @@ class GameState(BaseState):
         dangers = [danger_right, danger_up, danger_left, danger_down]
         objects = [obj_right, obj_up, obj_left, obj_down]
 
-        def resize_sprite(sprite):
-            return pygame.transform.scale(sprite, (state_size, state_size))
-
+        rects = []
         for i, (dx, dy, name) in enumerate(directions):
             cell_x = state_x + (dx + 1) * state_size
             cell_y = state_y + (dy + 1) * state_size
+            cell_rect = pygame.Rect(cell_x, cell_y, state_size, state_size)
+            rects.append(cell_rect)
 
-            pygame.draw.rect(
-                surface, BLACK, (cell_x, cell_y, state_size, state_size))
-            pygame.draw.rect(
-                surface, WHITE, (cell_x, cell_y, state_size, state_size), 1)
+            pygame.draw.rect(surface, BLACK, cell_rect)
+            pygame.draw.rect(surface, WHITE, cell_rect, 1)
 
             obj_type = objects[i]
-            if obj_type == self.interpreter.OBJ_GREEN:
-                resized_sprite = resize_sprite(
-                    self.apple_sprites["GREEN_APPLE"])
-                surface.blit(resized_sprite, (cell_x, cell_y))
-            elif obj_type == self.interpreter.OBJ_RED:
-                resized_sprite = resize_sprite(
-                    self.apple_sprites["RED_APPLE"])
-                surface.blit(resized_sprite, (cell_x, cell_y))
-            elif obj_type == self.interpreter.OBJ_BODY:
-                resized_sprite = resize_sprite(
-                    self.snake_body_sprites["h"])
-                surface.blit(resized_sprite, (cell_x, cell_y))
-            elif obj_type == self.interpreter.OBJ_WALL:
-                text = self.font.render("W", True, WHITE)
-                text_rect = text.get_rect(center=(cell_x + state_size // 2,
-                                                  cell_y + state_size // 2))
-                surface.blit(text, text_rect)
-            elif obj_type == self.interpreter.TAIL:
-                resized_sprite = resize_sprite(self.snake_tail_sprites[(0, 1)])
-                surface.blit(resized_sprite, (cell_x, cell_y))
+            if obj_type == self.interpreter.OBJ_WALL:
+                text = self.render_text("wall", "W")
+                surface.blit(text, text.get_rect(center=cell_rect.center))
+            elif obj_type in self._panel_sprites:
+                surface.blit(self._panel_sprites[obj_type], (cell_x, cell_y))
 
             if dangers[i] == 1:
-                text = self.font.render("!", True, DARK_RED)
+                text = self.render_text("danger", "!", DARK_RED)
                 text_rect = text.get_rect(center=(cell_x + state_size // 2 + 7,
                                                   cell_y + state_size // 2))
                 surface.blit(text, text_rect)
 
+        self._drawn_state = self.current_state
+        return rects
+
+    def close(self):
+        self.trace.close()
+
     def reset(self):
         self.env.reset()
         self._snake_timer = 0.0
@@ -274,26 +258,58 @@ class GameState(BaseState):
             self.agent.decay_epsilon()
         self.current_state = self.interpreter.get_state(
             self.env.snake, self.env.board)
+        self._scene_changed = True
+        self._full_redraw = True
 
     def _build_board_surface(self):
-        surf = pygame.Surface((self.board_size, self.board_size))
-        surf.fill(BLACK)
-
-        pygame.draw.rect(
-            surf,
-            WHITE,
-            pygame.Rect(0, 0, self.board_size, self.board_size),
-            width=1
-        )
-
-        for i in range(1, self.grid_size):
-            x = i * self.cell_size
-            pygame.draw.line(surf,
-                             (128, 128, 128), (x, 0), (x, self.board_size), 1)
-            pygame.draw.line(surf,
-                             (128, 128, 128), (0, x), (self.board_size, x), 1)
-
-        return surf
+        return build_board_surface(self.grid_size, self.cell_size)
+
+    def _around_board(self):
+        """The four screen bands around the board."""
+        left, top = int(self.board_x), int(self.board_y)
+        size = int(self.board_size)
+        right, bottom = left + size, top + size
+        return [pygame.Rect(0, 0, 1080, top),
+                pygame.Rect(0, bottom, 1080, 720 - bottom),
+                pygame.Rect(0, top, left, size),
+                pygame.Rect(right, top, 1080 - right, size)]
+
+    def _scene(self):
+        """Sprite of every occupied cell; the snake covers the apples."""
+        scene = {}
+        for cell in self.env.apples[RED_APPLE]:
+            scene[cell] = self.apple_sprites["RED_APPLE"]
+        for cell in self.env.apples[GREEN_APPLE]:
+            scene[cell] = self.apple_sprites["GREEN_APPLE"]
+        snake = self.env.snake
+        for i, cell in enumerate(snake):
+            scene[cell] = self.sprites.segment_sprite(snake, i,
+                                                      self.env.direction)
+        return scene
+
+    def _update_board_layer(self):
+        """Redraw changed cells on the board layer, return their rects."""
+        if not self._scene_changed:
+            return []
+        self._scene_changed = False
+
+        scene = self._scene()
+        drawn = self._drawn_cells
+        cell_size = int(self.cell_size)
+        rects = []
+        for cell in drawn.keys() | scene.keys():
+            sprite = scene.get(cell)
+            if drawn.get(cell) is sprite:
+                continue
+            col, row = cell
+            rect = pygame.Rect((col - 1) * cell_size, (row - 1) * cell_size,
+                               cell_size, cell_size)
+            self.board_layer.blit(self.board_surface, rect, rect)
+            if sprite is not None:
+                self.board_layer.blit(sprite, rect)
+            rects.append(rect)
+        self._drawn_cells = scene
+        return rects
 
     def handle_events(self, event):
         if event.type == pygame.KEYDOWN:
@@ -302,6 +318,7 @@ class GameState(BaseState):
                 return
             if event.key == pygame.K_SPACE:
                 self._step_by_step = not self._step_by_step
+                self._full_redraw = True
                 return
             if event.key == pygame.K_RETURN:
                 if self._step_by_step:
@@ -310,9 +327,17 @@ class GameState(BaseState):
             if event.key == pygame.K_l:
                 self.reset()
                 return
+            if event.key == pygame.K_f:
+                self._speed_idx = (self._speed_idx + 1) % len(SPEEDS)
+                self._snake_timer = 0.0
+                return
+
+    @property
+    def fast_forward(self):
+        return SPEEDS[self._speed_idx] != 1 and not self._step_by_step
 
     def update(self, dt):
-        if self._nb_steps >= 500:
+        if self._nb_steps >= MAX_STEPS and not self.fast_forward:
             self._end_game = True
             return
 
@@ -324,6 +349,11 @@ class GameState(BaseState):
         if self._bg_timer >= bg_interval:
             self._bg_timer -= bg_interval
             self.animated_background.update(dt)
+            self._background_changed = True
+
+        if self.fast_forward:
+            self._fast_forward()
+            return
 
         snake_interval = 1.0 / self.snake_speed
 
@@ -331,17 +361,41 @@ class GameState(BaseState):
             self._snake_timer -= snake_interval
             self._update_snake()
 
+    def _fast_forward(self):
+        """
+        Run this frame's steps back to back, within FAST_FRAME_BUDGET, and
+        start the next episode as soon as one ends. Only the state reached
+        at the end of the frame gets drawn.
+        """
+        deadline = perf_counter() + FAST_FRAME_BUDGET
+        speed = SPEEDS[self._speed_idx]
+        steps = -1
+        if speed:
+            steps_per_sec = self.snake_speed * speed
+            steps = int(self._snake_timer * steps_per_sec)
+            self._snake_timer -= steps / steps_per_sec
+
+        while steps != 0:
+            if self._end_game or self._nb_steps >= MAX_STEPS:
+                self.reset()
+                if self.nb_sessions > self.settings["sessions"]:
+                    return
+            self._update_snake()
+            steps -= 1
+            if perf_counter() >= deadline:
+                self._snake_timer = 0.0
+                return
+
     def _update_snake(self):
         if (self._step_by_step and self._paused) or self._end_game:
             return
 
         action_idx = self.agent.choose_action(self.current_state)
-        self.interpreter.print_vision(self.env.board)
-        print(index_to_string(action_idx))
         self.env.direction = index_to_action_tuple(action_idx)
         result: ActionResult = self.env.step()
         next_state = self.interpreter.get_state(self.env.snake, self.env.board)
         reward = self.interpreter.get_reward(result)
+        self.trace.record(self.current_state, action_idx, reward)
 
         if result.snake_length < 1 or result.action_state == ActionState.DEAD:
             self._end_game = True
@@ -351,25 +405,73 @@ class GameState(BaseState):
                               reward, next_state, self._end_game)
 
         self.current_state = next_state
+        self._scene_changed = True
 
         if self._step_by_step and not self._paused:
             self._paused = True
 
         self._nb_steps += 1
 
-    def draw(self, surface):
+    def _current_texts(self):
+        return {"score": self.score_text(),
+                "session": self.session_text(),
+                "speed": self.speed_text()}
+
+    def _paint(self, surface, area=None):
+        """
+        Draw the background, the board layer, the texts and the vision
+        panel, only within `area` when given.
+        """
+        surface.set_clip(area)
         self.animated_background.draw(surface)
-        if self._end_game:
-            self.draw_end_screen(surface)
-            return
-
-        self.draw_board(surface)
-        self.draw_score(surface)
-        self.draw_session_info(surface)
-
-        self.draw_apples(surface, "RED_APPLE", self.env.apples[5])
-        self.draw_apples(surface, "GREEN_APPLE", self.env.apples[4])
-        self.draw_snake(surface, self.env.snake, self.env.direction)
-
+        surface.blit(self.board_layer, (self.board_x, self.board_y))
+        self._text_rects["score"] = self.draw_score(surface)
+        self._text_rects["session"] = self.draw_session_info(surface)
+        self._text_rects["speed"] = self.draw_speed(surface)
         if self._step_by_step:
             self.draw_state(surface)
+        surface.set_clip(None)
+
+    def draw(self, surface):
+        """
+        Draw the frame and return the screen rects that changed, or None
+        when the whole screen was redrawn.
+        """
+        if self._end_game:
+            self.animated_background.draw(surface)
+            self.draw_end_screen(surface)
+            self._full_redraw = True
+            return None
+
+        cells = self._update_board_layer()
+        texts = self._current_texts()
+
+        if self._full_redraw:
+            self._paint(surface)
+            self._drawn_texts = texts
+            self._background_changed = False
+            self._full_redraw = False
+            return None
+
+        rects = []
+        if self._step_by_step and self._drawn_state != self.current_state:
+            rects.extend(self.draw_state(surface))
+
+        areas = []
+        if self._background_changed:
+            areas.extend(self._background_rects)
+            self._background_changed = False
+        for slot, text in texts.items():
+            if text != self._drawn_texts.get(slot):
+                areas.append(self._text_rects[slot].union(
+                    self.text_rect(slot, text)))
+        for area in areas:
+            self._paint(surface, area)
+        rects.extend(areas)
+        self._drawn_texts = texts
+
+        for rect in cells:
+            screen_rect = rect.move(self.board_x, self.board_y)
+            surface.blit(self.board_layer, screen_rect, rect)
+            rects.append(screen_rect)
+        return rects
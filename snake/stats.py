@@ -0,0 +1,107 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class StreamingStats:
+    """
+    Statistics of a stream of non-negative integers, such as final snake
+    lengths, in constant memory.
+
+    The mean and variance are updated with Welford's algorithm. Values are
+    also counted in a histogram, grown up to the largest value seen (the
+    board area for lengths), from which the quantiles are exact. Two
+    accumulators merge as if they had seen both streams.
+    """
+
+    def __init__(self, size: int = 64) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.histogram = np.zeros(max(size, 1), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: int) -> None:
+        if value < 0:
+            raise ValueError("StreamingStats only counts non-negative "
+                             "values.")
+        if value >= len(self.histogram):
+            self._grow(value + 1)
+        self.histogram[value] += 1
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def merge(self, other: "StreamingStats") -> None:
+        if other.count == 0:
+            return
+        if len(other.histogram) > len(self.histogram):
+            self._grow(len(other.histogram))
+        self.histogram[:len(other.histogram)] += other.histogram
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += (other._m2
+                     + delta * delta * self.count * other.count / count)
+        self.mean += delta * other.count / count
+        self.count = count
+
+    def _grow(self, size: int) -> None:
+        histogram = np.zeros(max(size, 2 * len(self.histogram)),
+                             dtype=np.int64)
+        histogram[:len(self.histogram)] = self.histogram
+        self.histogram = histogram
+
+    @property
+    def variance(self) -> float:
+        """Sample variance, as statistics.variance."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self) -> Optional[int]:
+        values = np.flatnonzero(self.histogram)
+        return int(values[0]) if len(values) else None
+
+    @property
+    def max(self) -> Optional[int]:
+        values = np.flatnonzero(self.histogram)
+        return int(values[-1]) if len(values) else None
+
+    def _nth(self, n: int) -> int:
+        """The n-th smallest value, from 0."""
+        return int(np.searchsorted(np.cumsum(self.histogram), n,
+                                   side="right"))
+
+    def quantile(self, q: float) -> float:
+        """
+        The q quantile (0 <= q <= 1), interpolated between values as
+        np.percentile does by default.
+        """
+        if self.count == 0:
+            raise ValueError("No values to take a quantile of.")
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1.")
+        position = (self.count - 1) * q
+        below = math.floor(position)
+        low = self._nth(below)
+        if position == below:
+            return float(low)
+        return low + (position - below) * (self._nth(below + 1) - low)
+
+    def median(self):
+        """The median, as statistics.median."""
+        if self.count == 0:
+            raise ValueError("No values to take a median of.")
+        middle = self.count // 2
+        if self.count % 2:
+            return self._nth(middle)
+        return (self._nth(middle - 1) + self._nth(middle)) / 2
@@ -0,0 +1,362 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import statistics
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from snake.agent import QLearningSnakeAgent
+from snake.env import SnakeEnv
+from snake.eval import evaluate_agent
+from snake.rng import spawn_seeds
+from snake.train import (TRAIN_REWARDS,
+                         get_phase,
+                         make_interpreter,
+                         train_with_phases,
+                         with_convergence)
+
+# Values of the parameters a search space leaves out
+DEFAULT_PARAMS = {
+    **TRAIN_REWARDS,
+    "alpha": 0.15,
+    "gamma": 0.95,
+    "phase": "standard",
+    "episodes": 20_000,
+    "converge": False,
+}
+
+# Searched when no space is given: around the training defaults
+DEFAULT_SPACE = {
+    "reward_nothing": {"low": -3.0, "high": -0.5},
+    "reward_dead": {"low": -200.0, "high": -50.0},
+    "reward_green_apple": {"low": 5.0, "high": 40.0},
+    "reward_red_apple": {"low": -40.0, "high": -5.0},
+    "alpha": {"low": 0.05, "high": 0.5, "log": True},
+    "gamma": {"low": 0.8, "high": 0.99},
+}
+
+INT_PARAMS = ("episodes",)
+
+
+def grid_trials(space: Dict[str, list]) -> List[dict]:
+    """Every combination of the listed values."""
+    names = list(space)
+    return [{**DEFAULT_PARAMS, **dict(zip(names, values))}
+            for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_trials(space: dict, trials: int,
+                  seed: Optional[int] = None) -> List[dict]:
+    """
+    `trials` draws of the space. A parameter is either a list of values to
+    pick from, or a {"low", "high", "log"} range.
+    """
+    rng = np.random.default_rng(seed)
+    result = []
+    for _ in range(trials):
+        params = dict(DEFAULT_PARAMS)
+        for name, values in space.items():
+            if isinstance(values, dict):
+                low, high = values["low"], values["high"]
+                if values.get("log"):
+                    value = math.exp(rng.uniform(math.log(low),
+                                                 math.log(high)))
+                else:
+                    value = rng.uniform(low, high)
+                if name in INT_PARAMS:
+                    value = round(value)
+            else:
+                value = values[rng.integers(len(values))]
+            params[name] = value
+        result.append(params)
+    return result
+
+
+def trial_phases(params: dict) -> list:
+    """
+    Phases of `params["phase"]`, scaled to `params["episodes"]`, ending
+    early once converged if `params["converge"]`.
+    """
+    name = params["phase"]
+    episodes = int(params["episodes"])
+    phases = get_phase(None if name == "standard" else name, episodes)
+    total = sum(phase.episodes for phase in phases)
+    phases = [replace(phase,
+                      episodes=max(1, round(phase.episodes * episodes
+                                            / total)))
+              for phase in phases]
+    return with_convergence(phases) if params["converge"] else phases
+
+
+@dataclass
+class Trial:
+    trial_id: int
+    params: dict
+    seed: int
+    scores: List[float] = field(default_factory=list)
+    stopped: bool = False
+    finished: bool = False
+    games: int = 0
+    episodes: int = 0
+
+
+@dataclass
+class RungTask:
+    trial_id: int
+    params: dict
+    seed: int
+    rung: int
+    stop_episode: int
+    resume: Optional[dict]
+    eval_episodes: int
+    eval_max_steps: int
+    eval_seed: Optional[int]
+
+
+def _run_rung(task: RungTask):
+    """Train a trial up to the end of a rung, then evaluate it."""
+    params = task.params
+    env_seed, agent_seed = spawn_seeds(task.seed, 2)
+    agent = QLearningSnakeAgent(alpha=params["alpha"],
+                                gamma=params["gamma"],
+                                train=True, seed=agent_seed)
+    env = SnakeEnv(10, 3, 1, 2, seed=env_seed)
+    interpreter = make_interpreter(
+        **{name: params[name] for name in TRAIN_REWARDS})
+
+    snapshot = train_with_phases(agent=agent,
+                                 env=env,
+                                 interpreter=interpreter,
+                                 phases=trial_phases(params),
+                                 max_steps_per_episode=5000,
+                                 progress=False,
+                                 resume=task.resume,
+                                 stop_episode=task.stop_episode)
+
+    report = evaluate_agent(agent, task.eval_episodes, 10,
+                            task.eval_max_steps, task.eval_seed)
+    lengths = report.snake_lengths
+    return task, lengths.mean, lengths.count, snapshot
+
+
+class Sweep:
+    """
+    Train and evaluate trials, `rungs` times each, across a process pool.
+
+    Each trial is trained in `rungs` equal slices of its episodes and
+    evaluated after each one on the same seeded episodes as every other
+    trial. A trial whose score at a rung is below the median of the scores
+    other trials reached at that rung (once `min_peers` did) is stopped
+    there (median stopping rule).
+
+    A trial whose training ends before a rung's budget (a phase converged,
+    with the "converge" parameter) is finished: its agent no longer
+    changes, so its score stands for its remaining rungs.
+
+    Trial seeds and the evaluation seed are drawn from independent
+    children of `seed`, so no trial trains on the evaluation games.
+    """
+
+    def __init__(self, trials: List[dict],
+                 workers: int = 1,
+                 rungs: int = 3,
+                 min_peers: int = 3,
+                 eval_episodes: int = 500,
+                 eval_max_steps: int = 1000,
+                 seed: Optional[int] = None) -> None:
+        if rungs < 1:
+            raise ValueError("rungs must be at least 1.")
+        trial_seeds, eval_seed = spawn_seeds(seed, 2)
+        seeds = trial_seeds.spawn(len(trials))
+        self.trials = [Trial(i, params, int(s.generate_state(1)[0]))
+                       for i, (params, s) in enumerate(zip(trials, seeds))]
+        self.workers = workers
+        self.rungs = rungs
+        self.min_peers = min_peers
+        self.eval_episodes = eval_episodes
+        self.eval_max_steps = eval_max_steps
+        self.eval_seed = int(eval_seed.generate_state(1)[0])
+        self._rung_scores = [[] for _ in range(rungs)]
+
+    def _task(self, trial: Trial, rung: int,
+              resume: Optional[dict]) -> RungTask:
+        total = sum(phase.episodes for phase in trial_phases(trial.params))
+        stop_episode = max(1, round(total * (rung + 1) / self.rungs))
+        return RungTask(trial.trial_id, trial.params, trial.seed, rung,
+                        stop_episode, resume, self.eval_episodes,
+                        self.eval_max_steps, self.eval_seed)
+
+    def _report(self, task: RungTask, score: float, games: int,
+                snapshot: dict) -> Optional[RungTask]:
+        """Record a rung result, and return the next task of the trial."""
+        trial = self.trials[task.trial_id]
+        trial.scores.append(score)
+        trial.games = games
+        trial.episodes = snapshot["global_episode"]
+        finished = snapshot["phase_index"] >= len(snapshot["phases"])
+
+        peers = self._rung_scores[task.rung]
+        below_median = (len(peers) >= self.min_peers
+                        and score < statistics.median(peers))
+        peers.append(score)
+
+        if task.rung + 1 == self.rungs:
+            return None
+        if below_median:
+            trial.stopped = True
+            return None
+        if finished:
+            trial.finished = True
+            for rung in range(task.rung + 1, self.rungs):
+                trial.scores.append(score)
+                self._rung_scores[rung].append(score)
+            return None
+        return self._task(trial, task.rung + 1, snapshot)
+
+    def run(self, progress: bool = True) -> List[Trial]:
+        queue = deque(self._task(trial, 0, None) for trial in self.trials)
+        done = 0
+
+        def report(result):
+            nonlocal done
+            task = self._report(*result)
+            if task is not None:
+                queue.append(task)
+            else:
+                done += 1
+                if progress:
+                    trial = self.trials[result[0].trial_id]
+                    print(f"Trial {trial.trial_id} done ({done}/"
+                          f"{len(self.trials)}): score "
+                          f"{trial.scores[-1]:.2f} after "
+                          f"{len(trial.scores)} rung(s)")
+
+        if self.workers <= 1:
+            while queue:
+                report(_run_rung(queue.popleft()))
+        else:
+            with ProcessPoolExecutor(self.workers) as pool:
+                running = set()
+                while queue or running:
+                    while queue and len(running) < self.workers:
+                        running.add(pool.submit(_run_rung, queue.popleft()))
+                    finished, running = wait(running,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        report(future.result())
+
+        return self.ranked()
+
+    def ranked(self) -> List[Trial]:
+        """Trials by rungs completed, then by last score."""
+        return sorted(self.trials,
+                      key=lambda t: (len(t.scores),
+                                     t.scores[-1] if t.scores else 0.0),
+                      reverse=True)
+
+
+def write_results(trials: List[Trial], path: str) -> None:
+    names = list(DEFAULT_PARAMS)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "trial", *names, "score", "rungs",
+                         "stopped", "finished", "trained_episodes", "games",
+                         "scores"])
+        for rank, trial in enumerate(trials, 1):
+            writer.writerow([rank, trial.trial_id,
+                             *(trial.params[n] for n in names),
+                             f"{trial.scores[-1]:.3f}" if trial.scores
+                             else "", len(trial.scores), trial.stopped,
+                             trial.finished, trial.episodes, trial.games,
+                             " ".join(f"{s:.3f}" for s in trial.scores)])
+
+
+def print_results(trials: List[Trial], top: int = 10) -> None:
+    names = list(DEFAULT_PARAMS)
+    print(f"{'rank':>4} {'trial':>5} {'score':>7} {'rungs':>5}  "
+          + " ".join(f"{n:>18}" for n in names))
+    for rank, trial in enumerate(trials[:top], 1):
+        score = trial.scores[-1] if trial.scores else 0.0
+        values = " ".join(
+            f"{v:>18.4g}" if isinstance(v, float) else f"{v!s:>18}"
+            for v in (trial.params[n] for n in names))
+        print(f"{rank:>4} {trial.trial_id:>5} {score:>7.2f} "
+              f"{len(trial.scores):>5}  {values}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search training hyperparameters.")
+    parser.add_argument("--space", type=str,
+                        help="JSON file mapping parameters to a list of "
+                             "values or a {low, high, log} range "
+                             "(default: around the training rewards)")
+    parser.add_argument("--mode", type=str, default="random",
+                        choices=("grid", "random"),
+                        help="Try every combination of listed values, or "
+                             "random draws")
+    parser.add_argument("--trials", type=int, default=20,
+                        help="Number of random trials")
+    parser.add_argument("--episodes", type=int,
+                        help="Training episodes of every trial, unless "
+                             "searched")
+    parser.add_argument("--phase", type=str,
+                        choices=("standard", "basic", "intensive",
+                                 "optimal"),
+                        help="Phase schedule of every trial, unless "
+                             "searched")
+    parser.add_argument("--converge", action="store_true",
+                        help="End the training phases of every trial "
+                             "early once converged, unless searched")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes running trials")
+    parser.add_argument("--rungs", type=int, default=3,
+                        help="Evaluations per trial, where poor trials "
+                             "are stopped")
+    parser.add_argument("--eval_episodes", type=int, default=500,
+                        help="Evaluation episodes at every rung")
+    parser.add_argument("--eval_max_steps", type=int, default=1000,
+                        help="Maximum steps of an evaluation episode")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the trials and evaluation episodes")
+    parser.add_argument("--out", type=str, default="sweep_results.csv",
+                        help="CSV file receiving the ranked trials")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+
+    if args.mode == "grid":
+        if any(isinstance(values, dict) for values in space.values()):
+            parser.error("grid mode needs a list of values per parameter")
+        trials = grid_trials(space)
+    else:
+        trials = random_trials(space, args.trials, args.seed)
+
+    for params in trials:
+        if args.episodes is not None and "episodes" not in space:
+            params["episodes"] = args.episodes
+        if args.phase is not None and "phase" not in space:
+            params["phase"] = args.phase
+        if args.converge and "converge" not in space:
+            params["converge"] = True
+
+    sweep = Sweep(trials, args.workers, args.rungs,
+                  eval_episodes=args.eval_episodes,
+                  eval_max_steps=args.eval_max_steps, seed=args.seed)
+    ranked = sweep.run()
+    write_results(ranked, args.out)
+    print_results(ranked)
+    print(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
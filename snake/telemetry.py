@@ -0,0 +1,181 @@
+import json
+import time
+from typing import Optional
+
+import numpy as np
+
+from snake.action import ActionState
+
+WALL = 1
+BODY = 3
+
+
+class Telemetry:
+    """
+    Training metrics aggregated per interval and per phase.
+
+    Episodes only bump counters; records are built and appended to a
+    JSON-lines file every `flush_seconds` and at the end of each phase,
+    followed there by a summary record of the whole phase ("summary":
+    true). Env, interpreter and agent time is measured on one episode out
+    of `sample_every` only, so the timers stay off the hot path.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 flush_seconds: float = 5.0,
+                 sample_every: int = 16,
+                 plot: bool = False) -> None:
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.sample_every = sample_every
+        self.plot = plot
+
+        self._file = open(path, "a") if path else None
+        self._figure = None
+        self._history = []
+        self.phase = None
+        self._agent = None
+        self._reset_phase()
+        self._reset_interval()
+
+    def _reset_interval(self) -> None:
+        self._start = time.perf_counter()
+        self._episodes = 0
+        self._steps = 0
+        self._reward = 0.0
+        self._length = 0
+        self._deaths = {"wall": 0, "body": 0, "stopped": 0}
+        self._timed_steps = 0
+        self._time_env = 0.0
+        self._time_interpreter = 0.0
+        self._time_agent = 0.0
+
+    def _reset_phase(self) -> None:
+        self._phase_start = time.perf_counter()
+        self._phase_episodes = 0
+        self._phase_steps = 0
+        self._phase_reward = 0.0
+        self._phase_length = 0
+        self._phase_td_error = 0.0
+        self._phase_updates = 0
+
+    def start_phase(self, name: str, agent) -> None:
+        self.phase = name
+        self._agent = agent
+        self._reset_phase()
+        self._reset_interval()
+
+    def end_phase(self) -> None:
+        self.flush()
+        if self._phase_episodes:
+            episodes = self._phase_episodes
+            self._write({
+                "time": time.time(),
+                "phase": self.phase,
+                "summary": True,
+                "episodes": episodes,
+                "steps": self._phase_steps,
+                "wall_time": time.perf_counter() - self._phase_start,
+                "mean_reward": self._phase_reward / episodes,
+                "mean_length": self._phase_length / episodes,
+                "mean_td_error": (self._phase_td_error / self._phase_updates
+                                  if self._phase_updates else None),
+            })
+        self.phase = None
+
+    def should_time(self, episode: int) -> bool:
+        return episode % self.sample_every == 0
+
+    def record_episode(self, steps: int, total_reward: float,
+                       snake_length: int, action_state,
+                       cause_death: Optional[int]) -> None:
+        self._episodes += 1
+        self._steps += steps
+        self._reward += total_reward
+        self._length += snake_length
+        self._phase_episodes += 1
+        self._phase_steps += steps
+        self._phase_reward += total_reward
+        self._phase_length += snake_length
+        if action_state != ActionState.DEAD:
+            self._deaths["stopped"] += 1
+        elif cause_death == WALL:
+            self._deaths["wall"] += 1
+        else:
+            self._deaths["body"] += 1
+
+        if time.perf_counter() - self._start >= self.flush_seconds:
+            self.flush()
+
+    def record_td_errors(self, total: float, count: int) -> None:
+        """Absolute TD errors of an episode's updates, summed."""
+        self._phase_td_error += total
+        self._phase_updates += count
+
+    def record_times(self, steps: int, env: float, interpreter: float,
+                     agent: float) -> None:
+        self._timed_steps += steps
+        self._time_env += env
+        self._time_interpreter += interpreter
+        self._time_agent += agent
+
+    def flush(self) -> None:
+        if self._episodes == 0:
+            return
+
+        elapsed = time.perf_counter() - self._start
+        timed = max(self._timed_steps, 1)
+        q_table = self._agent.q_table
+        record = {
+            "time": time.time(),
+            "phase": self.phase,
+            "episodes": self._episodes,
+            "steps": self._steps,
+            "episodes_per_sec": self._episodes / elapsed,
+            "steps_per_sec": self._steps / elapsed,
+            "env_us_per_step": self._time_env / timed * 1e6,
+            "interpreter_us_per_step": self._time_interpreter / timed * 1e6,
+            "agent_us_per_step": self._time_agent / timed * 1e6,
+            "mean_reward": self._reward / self._episodes,
+            "mean_length": self._length / self._episodes,
+            "deaths": dict(self._deaths),
+            "epsilon": self._agent.epsilon,
+            "q_table_occupancy":
+                int(np.count_nonzero(q_table.any(axis=1))) / len(q_table),
+        }
+
+        self._write(record)
+        if self.plot:
+            self._update_plot(record)
+        self._reset_interval()
+
+    def _write(self, record: dict) -> None:
+        if self._file is not None:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _update_plot(self, record: dict) -> None:
+        import matplotlib.pyplot as plt
+
+        self._history.append(record)
+        if self._figure is None:
+            plt.ion()
+            self._figure, self._axes = plt.subplots(3, 1, sharex=True)
+            self._figure.canvas.manager.set_window_title(
+                "Learn2Slither training")
+
+        metrics = (("steps_per_sec", "steps/s"),
+                   ("mean_length", "mean length"),
+                   ("epsilon", "epsilon"))
+        for ax, (key, label) in zip(self._axes, metrics):
+            ax.clear()
+            ax.plot([r[key] for r in self._history])
+            ax.set_ylabel(label)
+        self._axes[-1].set_xlabel("interval")
+        plt.pause(0.001)
@@ -0,0 +1,119 @@
+import argparse
+import struct
+from typing import Optional
+
+import numpy as np
+
+from snake.action import index_to_string
+from snake.interpreter import STATE_RADICES, decode_state
+
+# Trace layout: a fixed 32-byte header followed by packed records of
+# (state code, action index, reward), appended a buffer at a time.
+MAGIC = b"L2ST"
+VERSION = 1
+HEADER = struct.Struct("<4sHHH8B")
+HEADER_SIZE = 32
+RECORD = np.dtype([("state", "<u2"), ("action", "u1"), ("reward", "<f4")])
+
+OBJECT_NAMES = ("green", "red", "body", "wall", "tail")
+DIRECTION_NAMES = ("up", "down", "left", "right")
+
+
+class TraceRecorder:
+    """
+    Step records kept in a fixed NumPy buffer.
+
+    With a `path`, the buffer is appended to the file every time it fills
+    up and on `flush`. Without one, it is a ring buffer holding the last
+    `capacity` steps.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 capacity: int = 4096) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self.path = path
+        self.records = np.zeros(capacity, dtype=RECORD)
+        self.count = 0
+        self.total = 0
+
+        self._file = None
+        if path:
+            self._file = open(path, "wb")
+            header = HEADER.pack(MAGIC, VERSION, len(STATE_RADICES),
+                                 RECORD.itemsize, *STATE_RADICES)
+            self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def record(self, state: int, action: int, reward: float) -> None:
+        i = self.total % len(self.records)
+        self.records[i] = (state, action, reward)
+        self.total += 1
+        self.count = min(self.count + 1, len(self.records))
+        if self._file is not None and self.count == len(self.records):
+            self.flush()
+
+    def last(self) -> np.ndarray:
+        """Buffered records, oldest first."""
+        start = (self.total - self.count) % len(self.records)
+        return np.roll(self.records, -start)[:self.count]
+
+    def flush(self) -> None:
+        if self._file is None or self.count == 0:
+            return
+        self._file.write(self.last().tobytes())
+        self._file.flush()
+        self.count = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_trace(path: str) -> np.ndarray:
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a trace.")
+
+    (_, version, radix_count, record_size,
+     *radices) = HEADER.unpack(header)
+    if version != VERSION or record_size != RECORD.itemsize:
+        raise ValueError(f"Unsupported trace version {version}.")
+    if tuple(radices[:radix_count]) != STATE_RADICES:
+        raise ValueError("Trace was saved with another state encoding.")
+
+    return np.fromfile(path, dtype=RECORD, offset=HEADER_SIZE)
+
+
+def format_record(index: int, record) -> str:
+    state = decode_state(record["state"])
+    dangers = "".join(name[0].upper() if danger else "."
+                      for name, danger in zip(DIRECTION_NAMES, state[:4]))
+    objects = " ".join(f"{name}={OBJECT_NAMES[obj]}"
+                       for name, obj in zip(DIRECTION_NAMES, state[4:]))
+    return (f"{index:>8} state {int(record['state']):>4} danger {dangers} "
+            f"{objects:<42} {index_to_string(int(record['action'])):<5} "
+            f"reward {float(record['reward']):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the steps of a trace file.")
+    parser.add_argument("path", type=str, help="Trace file")
+    parser.add_argument("--start", type=int, default=0,
+                        help="First step to print")
+    parser.add_argument("--count", type=int,
+                        help="Number of steps to print")
+    args = parser.parse_args()
+
+    records = read_trace(args.path)
+    stop = len(records) if args.count is None else args.start + args.count
+    for i in range(args.start, min(stop, len(records))):
+        print(format_record(i, records[i]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,35 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import copy
+from dataclasses import replace
+from multiprocessing import Process, shared_memory
+from time import perf_counter
 from typing import List
 
+import numpy as np
 from tqdm import trange
 
-from snake.phases import (optimal_cfg,
+from snake.phases import (Convergence,
+                          PhaseConfig,
+                          optimal_cfg,
                           get_standard_phases_cfg,
                           basic_cfg,
-                          intensive_cfg)
-from snake.action import ActionResult, index_to_action_tuple, ActionState
-from snake.agent import QLearningSnakeAgent
+                          intensive_cfg,
+                          with_convergence)
+from snake.action import index_to_action_tuple, ActionState
+from snake.agent import QLearningSnakeAgent, new_q_table
+from snake.checkpoint import (CheckpointWriter,
+                              latest_checkpoint,
+                              load_checkpoint)
+from snake.convergence import ConvergenceMonitor
+from snake.bitboard_env import make_env
 from snake.env import SnakeEnv
+from snake.eval import evaluate_agent
 from snake.interpreter import Interpreter
-
-
-@dataclass
-class PhaseConfig:
-    name: str
-    episodes: int
-    eps_start: float = 0.0
-    eps_end: float = 0.0
+from snake.recording import RecordingWriter, reseed_episode
+from snake.replay import ReplayBuffer
+from snake.rng import spawn_seeds
+from snake.telemetry import Telemetry
 
 
 def train_with_phases(
@@ -28,77 +37,512 @@ def train_with_phases(
         env: SnakeEnv,
         interpreter: Interpreter,
         phases: List[PhaseConfig],
-        max_steps_per_episode: int
+        max_steps_per_episode: int,
+        progress: bool = True,
+        replay: ReplayBuffer | None = None,
+        replay_interval: int = 4,
+        checkpoint: CheckpointWriter | None = None,
+        checkpoint_every: int = 10_000,
+        resume: dict | None = None,
+        telemetry: Telemetry | None = None,
+        recording: RecordingWriter | None = None,
+        stop_episode: int | None = None
 ):
+    """
+    Run the training phases in order.
+
+    Without `replay`, every transition is learned once, as it happens.
+    With it, transitions are stored in the buffer and every
+    `replay_interval` steps the agent learns from one sampled minibatch.
+
+    With `checkpoint`, a snapshot of the training state is handed to the
+    writer every `checkpoint_every` episodes. Passing such a snapshot as
+    `resume` continues training exactly where it was taken (the replay
+    buffer it holds must be passed as `replay`).
+
+    With `telemetry`, throughput, component timings and episode outcomes
+    are reported per interval and per phase.
+
+    With `recording`, every episode is appended to it; the env stream is
+    then restarted from a seed drawn from it before each episode.
+
+    With `stop_episode`, training stops once that many episodes were run
+    in total.
+
+    A phase with a `convergence` config ends as soon as its progress
+    stalls (see snake.convergence).
+
+    Returns the snapshot that resumes training where it stopped. Once every
+    phase is done, its phase_index is the number of phases.
+    """
     global_episode = 0
+    global_step = 0
+    start_phase = start_episode = 0
+    episodes_saved = 0
+
+    if resume is not None:
+        if resume["phases"] != [phase.name for phase in phases]:
+            raise ValueError("Checkpoint was taken with other phases.")
+        if resume.get("phase_episodes") != [phase.episodes
+                                            for phase in phases]:
+            raise ValueError("Checkpoint was taken with other phase "
+                             "episode counts (check --sessions).")
+        start_phase = resume["phase_index"]
+        start_episode = resume["phase_episode"]
+        global_episode = resume["global_episode"]
+        global_step = resume["global_step"]
+        agent.q_table = np.array(resume["q_table"])
+        env.rng = resume["env_rng"]
+        agent.rng = resume["agent_rng"]
 
-    for phase in phases:
-        agent.epsilon = phase.eps_start
-        agent.eps_min = phase.eps_end
-        agent.calc_eps_decay(phase.episodes)
+    for phase_idx, phase in enumerate(phases):
+        if phase_idx < start_phase:
+            continue
+
+        first_episode = 0
+        if resume is not None and phase_idx == start_phase:
+            first_episode = start_episode
+            agent.epsilon = resume["epsilon"]
+            agent.eps_min = resume["eps_min"]
+            agent.eps_decay = resume["eps_decay"]
+        else:
+            agent.epsilon = phase.eps_start
+            agent.eps_min = phase.eps_end
+            agent.calc_eps_decay(phase.episodes)
 
         iterator = trange(
+            first_episode,
             phase.episodes,
+            initial=first_episode,
+            total=phase.episodes,
             desc=f"Training session: {phase.name}",
             unit="ep",
             leave=True,
+            disable=not progress,
         )
 
+        if telemetry is not None:
+            telemetry.start_phase(phase.name, agent)
+
+        monitor = None
+        if phase.convergence is not None and agent.is_train:
+            monitor = ConvergenceMonitor(
+                phase.convergence,
+                _greedy_score(agent, env, phase.convergence),
+                interpreter.reward_scale)
+
         for local_ep in iterator:
             global_episode += 1
+            if recording is not None:
+                episode_seed = reseed_episode(env)
             env.reset()
+            if recording is not None:
+                recording.start_episode(episode_seed, env)
 
-            state = interpreter.get_state(env.snake, env.board)
-            total_reward = 0.0
-            done = False
-            step = 0
+            times = ([0.0, 0.0, 0.0] if telemetry is not None
+                     and telemetry.should_time(global_episode) else None)
+            td_stats = [0.0, 0]
+            step, total_reward, result = _play_episode(
+                agent, env, interpreter, max_steps_per_episode, replay,
+                replay_interval, recording, global_step, td_stats, times)
+            global_step += step
 
-            while not done and step < max_steps_per_episode:
-                action_idx = agent.choose_action(state)
+            # An episode without steps ends as it was reset
+            if result is None:
+                length, action_state, cause = len(env.snake), None, None
+            else:
+                length = result.snake_length
+                action_state = result.action_state
+                cause = result.cause_death
 
-                env.direction = index_to_action_tuple(action_idx)
-                result: ActionResult = env.step()
-                if result.action_state == ActionState.DEAD:
-                    done = True
+            if telemetry is not None:
+                if times is not None:
+                    telemetry.record_times(step, *times)
+                telemetry.record_episode(step, total_reward, length,
+                                         action_state, cause)
+                telemetry.record_td_errors(*td_stats)
 
-                next_state = interpreter.get_state(env.snake, env.board)
-                reward = interpreter.get_reward(result)
-                total_reward += reward
+            if recording is not None:
+                recording.end_episode(length, cause)
 
-                if agent.is_train:
-                    agent.update(state, action_idx, reward, next_state, done)
+            agent.decay_epsilon()
 
-                state = next_state
-                step += 1
+            if (checkpoint is not None
+                    and global_episode % checkpoint_every == 0):
+                checkpoint.save(_snapshot(agent, env, replay, phases,
+                                          phase_idx, local_ep + 1,
+                                          global_episode, global_step))
 
-            agent.decay_epsilon()
+            if stop_episode is not None and global_episode >= stop_episode:
+                return _snapshot(agent, env, replay, phases, phase_idx,
+                                 local_ep + 1, global_episode, global_step)
+
+            if monitor is not None and monitor.end_episode(*td_stats):
+                saved = phase.episodes - (local_ep + 1)
+                episodes_saved += saved
+                if progress:
+                    stats = monitor.last
+                    score = ("" if stats["score"] is None
+                             else f"greedy length {stats['score']:.2f}, ")
+                    iterator.write(
+                        f"{phase.name} converged after {local_ep + 1} "
+                        f"episodes, {saved} saved ({score}relative TD "
+                        f"error {stats['td_error']:.3f}, no progress for "
+                        f"{stats['stale']} windows)")
+                break
+
+        if telemetry is not None:
+            telemetry.end_phase()
+
+    if episodes_saved and progress:
+        print(f"Convergence saved {episodes_saved} episodes")
 
     if agent.save_path:
         agent.save_model()
 
+    return _snapshot(agent, env, replay, phases, len(phases), 0,
+                     global_episode, global_step)
+
+
+def _greedy_score(agent: QLearningSnakeAgent,
+                  env: SnakeEnv,
+                  config: Convergence):
+    """
+    Scorer of the agent's greedy policy for `config`, None when the
+    convergence is tracked on the TD error. Every call plays the same
+    games, and leaves the agent's random stream as it found it.
+    """
+    if not config.eval_episodes:
+        return None
+
+    def score() -> float:
+        rng = copy.deepcopy(agent.rng)
+        try:
+            report = evaluate_agent(agent, config.eval_episodes,
+                                    env.map_size, config.eval_max_steps,
+                                    seed=0, backend=env.backend)
+        finally:
+            agent.rng = rng
+        return report.snake_lengths.mean
+
+    return score
+
+
+def _learn(agent: QLearningSnakeAgent,
+           replay: ReplayBuffer | None,
+           replay_interval: int,
+           td_stats: list,
+           global_step: int,
+           state: int,
+           action_idx: int,
+           reward: float,
+           next_state: int,
+           done: bool) -> None:
+    """
+    Learn one transition, at once or through `replay`. The absolute TD
+    errors of the updates and their count are added to `td_stats`.
+    """
+    if replay is None:
+        td_error = agent.update(state, action_idx, reward, next_state, done)
+        td_stats[0] += abs(td_error)
+        td_stats[1] += 1
+        return
+
+    replay.add(state, action_idx, reward, next_state, done)
+    if (global_step % replay_interval == 0
+            and len(replay) >= replay.batch_size):
+        td_errors = agent.update_batch(*replay.sample())
+        td_stats[0] += float(np.abs(td_errors).sum())
+        td_stats[1] += len(td_errors)
+
+
+def _play_episode(agent: QLearningSnakeAgent,
+                  env: SnakeEnv,
+                  interpreter: Interpreter,
+                  max_steps: int,
+                  replay: ReplayBuffer | None,
+                  replay_interval: int,
+                  recording: RecordingWriter | None,
+                  global_step: int,
+                  td_stats: list,
+                  times: list | None):
+    """
+    Play and learn one episode of a reset env.
+
+    With `times`, the time spent in the env, the interpreter and the agent
+    is added to its three items, in a loop of its own so that episodes
+    which are not timed pay nothing for it.
+
+    Returns the number of steps, the total reward and the last result
+    (None without steps).
+    """
+    state = interpreter.get_env_state(env)
+    total_reward = 0.0
+    done = False
+    step = 0
+    result = None
+    learn = agent.is_train
+
+    if times is None:
+        while not done and step < max_steps:
+            action_idx = agent.choose_action(state)
+            if recording is not None:
+                recording.add_action(action_idx)
+            env.direction = index_to_action_tuple(action_idx)
+            result = env.step()
+            done = result.action_state == ActionState.DEAD
+            next_state = interpreter.get_env_state(env)
+            reward = interpreter.get_reward(result)
+            total_reward += reward
+            if learn:
+                _learn(agent, replay, replay_interval, td_stats,
+                       global_step + step, state, action_idx, reward,
+                       next_state, done)
+            state = next_state
+            step += 1
+        return step, total_reward, result
+
+    while not done and step < max_steps:
+        t0 = perf_counter()
+        action_idx = agent.choose_action(state)
+        if recording is not None:
+            recording.add_action(action_idx)
+        env.direction = index_to_action_tuple(action_idx)
+        t1 = perf_counter()
+        result = env.step()
+        t2 = perf_counter()
+        done = result.action_state == ActionState.DEAD
+        next_state = interpreter.get_env_state(env)
+        reward = interpreter.get_reward(result)
+        total_reward += reward
+        t3 = perf_counter()
+        if learn:
+            _learn(agent, replay, replay_interval, td_stats,
+                   global_step + step, state, action_idx, reward,
+                   next_state, done)
+        t4 = perf_counter()
+        times[0] += t2 - t1
+        times[1] += t3 - t2
+        times[2] += (t1 - t0) + (t4 - t3)
+        state = next_state
+        step += 1
+    return step, total_reward, result
+
+
+def _snapshot(agent: QLearningSnakeAgent,
+              env: SnakeEnv,
+              replay: ReplayBuffer | None,
+              phases: List[PhaseConfig],
+              phase_idx: int,
+              phase_episode: int,
+              global_episode: int,
+              global_step: int) -> dict:
+    """Everything needed to resume training at an episode boundary."""
+    return {
+        "phases": [phase.name for phase in phases],
+        "phase_episodes": [phase.episodes for phase in phases],
+        "phase_index": phase_idx,
+        "phase_episode": phase_episode,
+        "global_episode": global_episode,
+        "global_step": global_step,
+        "q_table": np.array(agent.q_table),
+        "epsilon": agent.epsilon,
+        "eps_min": agent.eps_min,
+        "eps_decay": agent.eps_decay,
+        "env_rng": copy.deepcopy(env.rng),
+        "agent_rng": copy.deepcopy(agent.rng),
+        "replay": copy.deepcopy(replay),
+    }
+
+
+# Rewards used for training, unless overridden (see snake.sweep)
+TRAIN_REWARDS = {
+    "reward_nothing": -1.14,
+    "reward_dead": -115,
+    "reward_green_apple": 19.14,
+    "reward_red_apple": -21.96,
+}
+
+
+def make_interpreter(**rewards) -> Interpreter:
+    return Interpreter(**{**TRAIN_REWARDS, **rewards})
+
 
 def train_model(l_path: str,
                 s_path: str,
                 episodes: int | None,
-                phase: str | None):
-    env = SnakeEnv(10, 3, 1, 2)
-    interpreter = Interpreter(reward_nothing=-1.14,
-                              reward_dead=-115,
-                              reward_green_apple=19.14,
-                              reward_red_apple=-21.96)
+                phase: str | None,
+                workers: int = 1,
+                seed: int | None = None,
+                replay_capacity: int | None = None,
+                checkpoint_dir: str | None = None,
+                checkpoint_every: int = 10_000,
+                checkpoint_keep: int = 3,
+                resume: bool = False,
+                telemetry_path: str | None = None,
+                telemetry_plot: bool = False,
+                record_path: str | None = None,
+                map_size: int = 10,
+                backend: str = "array",
+                converge: bool = False):
+    env_seed, agent_seed, replay_seed = spawn_seeds(seed, 3)
     agent = QLearningSnakeAgent(
-        load_path=l_path, save_path=s_path, train=True
+        load_path=l_path, save_path=s_path, train=True, seed=agent_seed
     )
 
     phases_to_use = get_phase(phase, episodes)
+    if converge:
+        phases_to_use = with_convergence(phases_to_use)
 
-    train_with_phases(
-        agent=agent,
-        env=env,
-        interpreter=interpreter,
-        phases=phases_to_use,
-        max_steps_per_episode=5000
-    )
+    if workers > 1:
+        if (checkpoint_dir or telemetry_path or telemetry_plot
+                or record_path):
+            raise ValueError("Checkpoints, telemetry and recording are not "
+                             "supported with workers.")
+        train_hogwild(agent, phases_to_use, 5000, workers, seed,
+                      replay_capacity, map_size, backend)
+        return
+
+    env = make_env(backend, map_size, seed=env_seed)
+    interpreter = make_interpreter()
+    replay = (ReplayBuffer(replay_capacity, seed=replay_seed)
+              if replay_capacity else None)
+
+    resume_state = None
+    if resume:
+        path = latest_checkpoint(checkpoint_dir)
+        if path is None:
+            raise FileNotFoundError(f"No checkpoint in {checkpoint_dir}")
+        resume_state = load_checkpoint(path)
+        replay = resume_state["replay"]
+        print(f"Resuming from {path}")
+
+    checkpoint = (CheckpointWriter(checkpoint_dir, checkpoint_keep)
+                  if checkpoint_dir else None)
+    telemetry = (Telemetry(telemetry_path, plot=telemetry_plot)
+                 if telemetry_path or telemetry_plot else None)
+    recording = (RecordingWriter(record_path, map_size, backend=backend)
+                 if record_path else None)
+
+    try:
+        train_with_phases(
+            agent=agent,
+            env=env,
+            interpreter=interpreter,
+            phases=phases_to_use,
+            max_steps_per_episode=5000,
+            replay=replay,
+            checkpoint=checkpoint,
+            checkpoint_every=checkpoint_every,
+            resume=resume_state,
+            telemetry=telemetry,
+            recording=recording
+        )
+    finally:
+        if recording is not None:
+            recording.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if telemetry is not None:
+            telemetry.close()
+
+
+def _split_phases(phases: List[PhaseConfig],
+                  worker_id: int,
+                  workers: int) -> List[PhaseConfig]:
+    """Give each worker its share of every phase's episodes."""
+    return [replace(phase,
+                    episodes=phase.episodes // workers
+                    + (worker_id < phase.episodes % workers))
+            for phase in phases]
+
+
+def _hogwild_worker(shm_name: str,
+                    worker_id: int,
+                    phases: List[PhaseConfig],
+                    max_steps_per_episode: int,
+                    seed: int,
+                    replay_capacity: int | None,
+                    map_size: int,
+                    backend: str):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    env_seed, agent_seed, replay_seed = spawn_seeds(seed, 3)
+    agent = QLearningSnakeAgent(train=True, seed=agent_seed)
+    try:
+        agent.q_table = np.ndarray(agent.q_table.shape,
+                                   dtype=agent.q_table.dtype,
+                                   buffer=shm.buf)
+        env = make_env(backend, map_size, seed=env_seed)
+        replay = (ReplayBuffer(replay_capacity, seed=replay_seed)
+                  if replay_capacity else None)
+
+        train_with_phases(
+            agent=agent,
+            env=env,
+            interpreter=make_interpreter(),
+            phases=phases,
+            max_steps_per_episode=max_steps_per_episode,
+            progress=worker_id == 0,
+            replay=replay
+        )
+    finally:
+        # The view must go before close(), or a training error would be
+        # hidden by a BufferError.
+        agent.q_table = None
+        shm.close()
+
+
+def train_hogwild(agent: QLearningSnakeAgent,
+                  phases: List[PhaseConfig],
+                  max_steps_per_episode: int,
+                  workers: int,
+                  seed: int | None = None,
+                  replay_capacity: int | None = None,
+                  map_size: int = 10,
+                  backend: str = "array"):
+    """
+    Train `agent` with `workers` processes sharing one Q-table.
+
+    The table lives in shared memory and every worker applies its updates
+    without locking (Hogwild). Each worker runs its share of every phase
+    with its own epsilon schedule and seed. The table is copied back into
+    `agent` and saved once all workers are done.
+    """
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=new_q_table().nbytes)
+    q_table = None
+    try:
+        q_table = np.ndarray(agent.q_table.shape, dtype=agent.q_table.dtype,
+                             buffer=shm.buf)
+        q_table[:] = agent.q_table
+
+        seeds = spawn_seeds(seed, workers)
+        processes = [
+            Process(target=_hogwild_worker,
+                    args=(shm.name, worker_id,
+                          _split_phases(phases, worker_id, workers),
+                          max_steps_per_episode,
+                          int(seeds[worker_id].generate_state(1)[0]),
+                          replay_capacity, map_size, backend))
+            for worker_id in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        agent.q_table = q_table.copy()
+    finally:
+        del q_table
+        shm.close()
+        shm.unlink()
+
+    failed = [p.exitcode for p in processes if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} training worker(s) failed.")
+
+    if agent.save_path:
+        agent.save_model()
 
 
 def get_phase(phase: str | None, episodes: int):
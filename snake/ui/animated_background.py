@@ -25,6 +25,40 @@ class AnimatedGridBackground:
 
         self.vertical_offset_2 = grid_size // 2
 
+        # Pre-rendered grid layers, keyed by (color, alpha)
+        self._tiles = {}
+        self._grid_tile(grid_color_1)
+        self._grid_tile(grid_color_2)
+
+    def _grid_tile(self, color, alpha=255):
+        """
+        Grid layer one cell larger than the screen, so that blitting it at
+        any offset in (-grid_size, 0] covers the whole screen.
+        """
+        tile = self._tiles.get((color, alpha))
+        if tile is not None:
+            return tile
+
+        width = SCREEN_WIDTH + self.grid_size
+        height = SCREEN_HEIGHT + self.grid_size
+        # Lines are drawn on a colorkey background, so any key color
+        # different from the line color works
+        key = (255, 0, 255) if color != (255, 0, 255) else (0, 255, 0)
+        tile = pygame.Surface((width, height))
+        if pygame.display.get_surface() is not None:
+            tile = tile.convert()
+        tile.fill(key)
+        for x in range(0, width, self.grid_size):
+            pygame.draw.line(tile, color, (x, 0), (x, height), 1)
+        for y in range(0, height, self.grid_size):
+            pygame.draw.line(tile, color, (0, y), (width, y), 1)
+        tile.set_colorkey(key, pygame.RLEACCEL)
+        if alpha < 255:
+            tile.set_alpha(alpha)
+
+        self._tiles[(color, alpha)] = tile
+        return tile
+
     def update(self, dt):
         # Update grid positions
         self.grid_offset_1 += self.grid_speed_1 * dt * 60
@@ -36,41 +70,9 @@ class AnimatedGridBackground:
 
     def draw_grid(self, surface, offset_x, offset_y, color, alpha=255):
         """Draw a grid with the given offset"""
-        if alpha < 255:
-            # Create a temporary surface with alpha for transparency
-            temp_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT),
-                                          pygame.SRCALPHA)
-            color_with_alpha = (*color, alpha)
-
-            # Draw vertical lines
-            x = offset_x % self.grid_size - self.grid_size
-            while x < SCREEN_WIDTH + self.grid_size:
-                pygame.draw.line(temp_surface, color_with_alpha, (x, 0),
-                                 (x, SCREEN_HEIGHT), 1)
-                x += self.grid_size
-
-            # Draw horizontal lines
-            y = offset_y % self.grid_size - self.grid_size
-            while y < SCREEN_HEIGHT + self.grid_size:
-                pygame.draw.line(temp_surface, color_with_alpha, (0, y),
-                                 (SCREEN_WIDTH, y), 1)
-                y += self.grid_size
-
-            surface.blit(temp_surface, (0, 0))
-        else:
-            # Draw directly on the main surface
-            # Draw vertical lines
-            x = offset_x % self.grid_size - self.grid_size
-            while x < SCREEN_WIDTH + self.grid_size:
-                pygame.draw.line(surface, color, (x, 0),
-                                 (x, SCREEN_HEIGHT), 1)
-                x += self.grid_size
-
-            # Draw horizontal lines
-            y = offset_y % self.grid_size - self.grid_size
-            while y < SCREEN_HEIGHT + self.grid_size:
-                pygame.draw.line(surface, color, (0, y), (SCREEN_WIDTH, y), 1)
-                y += self.grid_size
+        x = int(offset_x % self.grid_size) - self.grid_size
+        y = int(offset_y % self.grid_size) - self.grid_size
+        surface.blit(self._grid_tile(color, alpha), (x, y))
 
     def draw(self, surface):
         surface.fill(self.background_color)
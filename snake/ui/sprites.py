@@ -0,0 +1,126 @@
+from typing import Deque, Iterable, Tuple
+
+import pygame
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+Coordinate = Tuple[int, int]
+
+
+def build_board_surface(grid_size: int, cell_size: int) -> pygame.Surface:
+    board_size = grid_size * cell_size
+    surf = pygame.Surface((board_size, board_size))
+    surf.fill(BLACK)
+
+    pygame.draw.rect(
+        surf,
+        WHITE,
+        pygame.Rect(0, 0, board_size, board_size),
+        width=1
+    )
+
+    for i in range(1, grid_size):
+        x = i * cell_size
+        pygame.draw.line(surf, GRAY, (x, 0), (x, board_size), 1)
+        pygame.draw.line(surf, GRAY, (0, x), (board_size, x), 1)
+
+    return surf
+
+
+class SnakeSprites:
+    """
+    Snake and apple sprites scaled to one cell, and the logic picking the
+    right sprite for every snake segment.
+
+    Only needs pygame surfaces, so it works with or without a display.
+    """
+
+    def __init__(self, loader, cell_size: int) -> None:
+        self.cell_size = cell_size
+
+        def scale(img):
+            return pygame.transform.scale(img, (cell_size, cell_size))
+
+        self.head = {
+            (-1, 0): scale(loader.load_image("L_HEAD.png")),
+            (1, 0): scale(loader.load_image("R_HEAD.png")),
+            (0, -1): scale(loader.load_image("U_HEAD.png")),
+            (0, 1): scale(loader.load_image("D_HEAD.png")),
+        }
+
+        self.tail = {
+            (-1, 0): scale(loader.load_image("R_TAIL.png")),
+            (1, 0): scale(loader.load_image("L_TAIL.png")),
+            (0, -1): scale(loader.load_image("D_TAIL.png")),
+            (0, 1): scale(loader.load_image("U_TAIL.png")),
+        }
+
+        self.body = {
+            "v": scale(loader.load_image("U-D_BODY.png")),
+            "h": scale(loader.load_image("L-R_BODY.png")),
+        }
+
+        self.angle_body = {
+            ((-1, 0), (0, -1)): scale(loader.load_image("U-L_BODY.png")),
+            ((0, -1), (-1, 0)): scale(loader.load_image("U-L_BODY.png")),
+            ((-1, 0), (0, 1)): scale(loader.load_image("D-L_BODY.png")),
+            ((0, 1), (-1, 0)): scale(loader.load_image("D-L_BODY.png")),
+            ((1, 0), (0, -1)): scale(loader.load_image("U-R_BODY.png")),
+            ((0, -1), (1, 0)): scale(loader.load_image("U-R_BODY.png")),
+            ((1, 0), (0, 1)): scale(loader.load_image("D-R_BODY.png")),
+            ((0, 1), (1, 0)): scale(loader.load_image("D-R_BODY.png")),
+        }
+
+        self.apples = {
+            "RED_APPLE": scale(loader.load_image("red_apple.png")),
+            "GREEN_APPLE": scale(loader.load_image("green_apple.png")),
+        }
+
+    def segment_sprite(self, snake: Deque[Coordinate], i: int,
+                       head_dir: Coordinate) -> pygame.Surface:
+        if i == 0:
+            # head
+            return self.head[head_dir]
+
+        if i == len(snake) - 1:
+            # tail
+            prev_col, prev_row = snake[-2]
+            tail_col, tail_row = snake[-1]
+            return self.tail[(tail_col - prev_col, tail_row - prev_row)]
+
+        # body
+        return self.body_sprite(snake[i - 1], snake[i], snake[i + 1])
+
+    def body_sprite(self,
+                    head: Coordinate,
+                    body: Coordinate,
+                    tail: Coordinate) -> pygame.Surface:
+        din = (head[0] - body[0], head[1] - body[1])
+        dout = (tail[0] - body[0], tail[1] - body[1])
+
+        if din == dout or din == (-dout[0], -dout[1]):
+            if din[1] != 0:
+                return self.body["v"]
+            else:
+                return self.body["h"]
+
+        return self.angle_body.get(
+            (din, dout), pygame.Surface((self.cell_size, self.cell_size)))
+
+    def draw_snake(self, surface, snake: Deque[Coordinate],
+                   head_dir: Coordinate, origin_x: int, origin_y: int):
+        for i, (col, row) in enumerate(snake):
+            x = origin_x + (col - 1) * self.cell_size
+            y = origin_y + (row - 1) * self.cell_size
+            surface.blit(self.segment_sprite(snake, i, head_dir), (x, y))
+
+    def draw_apples(self, surface, apple_type: str,
+                    apples: Iterable[Coordinate], origin_x: int,
+                    origin_y: int):
+        sprite = self.apples[apple_type]
+
+        for (x, y) in apples:
+            x = origin_x + (x - 1) * self.cell_size
+            y = origin_y + (y - 1) * self.cell_size
+            surface.blit(sprite, (x, y))
@@ -0,0 +1,220 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from snake.action import Actions
+from snake.env import EMPTY, WALL, HEAD, BODY, GREEN_APPLE, RED_APPLE
+
+# Per-env outcome codes returned by VecSnakeEnv.step
+NOTHING = 0
+EAT_RED_APPLE = 1
+EAT_GREEN_APPLE = 2
+DEAD = 3
+
+DIRECTIONS = np.array([action.value for action in Actions], dtype=np.intp)
+
+
+class VecSnakeEnv:
+    """
+    N independent snake games stepped together.
+
+    Boards live in one (N, map_size + 2, map_size + 2) array and every snake
+    body is a ring buffer of coordinates, so a step is a handful of NumPy
+    operations whatever the number of games. Finished games are reset
+    automatically at the end of the step that ended them.
+    """
+
+    def __init__(
+            self,
+            num_envs: int,
+            map_size: int,
+            snake_start_length: int,
+            red_apple_count: int,
+            green_apple_count: int,
+            seed: Optional[int] = None,
+    ) -> None:
+        if num_envs < 1:
+            raise ValueError("num_envs must be at least 1.")
+
+        if map_size < 3:
+            raise ValueError("map_size must be at least 3.")
+
+        if snake_start_length < 2:
+            raise ValueError("snake_start_length must be at least 2.")
+        self.rng = np.random.default_rng(seed)
+        self.num_envs = num_envs
+        self.map_size = map_size
+        self.snake_start_length = snake_start_length
+        self.red_apple_count = red_apple_count
+        self.green_apple_count = green_apple_count
+
+        size = map_size + 2
+        self.capacity = map_size * map_size + 1
+        self.boards: np.ndarray = np.zeros((num_envs, size, size),
+                                           dtype=np.int8)
+        # bodies[i, (head_idx[i] + k) % capacity] is segment k of snake i
+        self.bodies: np.ndarray = np.zeros((num_envs, self.capacity, 2),
+                                           dtype=np.intp)
+        self.head_idx: np.ndarray = np.zeros(num_envs, dtype=np.intp)
+        self.lengths: np.ndarray = np.zeros(num_envs, dtype=np.intp)
+        self.directions: np.ndarray = np.zeros((num_envs, 2), dtype=np.intp)
+
+        self.reset()
+
+    @property
+    def heads(self) -> np.ndarray:
+        """(N, 2) coordinates of every snake head."""
+        return self.bodies[np.arange(self.num_envs), self.head_idx]
+
+    @property
+    def tails(self) -> np.ndarray:
+        """(N, 2) coordinates of every snake tail."""
+        tail_idx = (self.head_idx + self.lengths - 1) % self.capacity
+        return self.bodies[np.arange(self.num_envs), tail_idx]
+
+    def reset(self) -> None:
+        """Reset every game."""
+        self._reset_rows(np.arange(self.num_envs))
+
+    def step(
+            self, actions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Move every snake by one cell.
+
+        `actions` holds one action index per game (see snake.action.Actions).
+        Returns (action_states, snake_lengths, cause_death) arrays of shape
+        (N,). cause_death is the cell that killed the snake (WALL or BODY)
+        and EMPTY otherwise. A game is over when its state is DEAD or its
+        length dropped to 0, and it is reset before this method returns.
+        """
+        n = self.num_envs
+        rows = np.arange(n)
+        cap = self.capacity
+
+        delta = DIRECTIONS[np.asarray(actions, dtype=np.intp)]
+        self.directions[:] = delta
+
+        heads = self.heads
+        tail_idx = (self.head_idx + self.lengths - 1) % cap
+        tails = self.bodies[rows, tail_idx]
+        new_heads = heads + delta
+        new_x, new_y = new_heads[:, 0], new_heads[:, 1]
+        cells = self.boards[rows, new_x, new_y]
+        hits_tail = (new_heads == tails).all(axis=1)
+
+        dead = ((cells == WALL) | (cells == BODY)) & ~hits_tail
+        alive = ~dead
+        green = alive & (cells == GREEN_APPLE)
+        red = alive & (cells == RED_APPLE)
+        move = alive & ~green & ~red
+
+        action_states = np.full(n, NOTHING, dtype=np.int8)
+        action_states[dead] = DEAD
+        action_states[green] = EAT_GREEN_APPLE
+        action_states[red] = EAT_RED_APPLE
+        cause_death = np.where(dead, cells, EMPTY).astype(np.int8)
+
+        # Advance the head of every surviving snake
+        a = rows[alive]
+        self.boards[a, heads[a, 0], heads[a, 1]] = BODY
+        self.head_idx[a] = (self.head_idx[a] - 1) % cap
+        self.bodies[a, self.head_idx[a]] = new_heads[a]
+
+        # Plain moves drop their tail, unless the head took its place
+        m = rows[move & ~hits_tail]
+        self.boards[m, tails[m, 0], tails[m, 1]] = EMPTY
+        self.boards[a, new_x[a], new_y[a]] = HEAD
+
+        self.lengths[green] += 1
+        self._place_apples(rows[green], GREEN_APPLE)
+        self._place_apples(rows[red], RED_APPLE)
+
+        # Red apples shrink the snake by one: the old tail and the segment
+        # before it are released, a one-segment snake is left with nothing.
+        r = rows[red]
+        short = self.lengths[r] == 1
+        self.boards[r, tails[r, 0], tails[r, 1]] = EMPTY
+        r_long = r[~short]
+        before_tail = self.bodies[r_long, (tail_idx[r_long] - 1) % cap]
+        self.boards[r_long, before_tail[:, 0], before_tail[:, 1]] = EMPTY
+        self.lengths[r_long] -= 1
+        self.lengths[r[short]] = 0
+
+        snake_lengths = self.lengths.copy()
+        done = dead | (self.lengths == 0)
+        if done.any():
+            self._reset_rows(rows[done])
+
+        return action_states, snake_lengths, cause_death
+
+    def _reset_rows(self, rows: np.ndarray) -> None:
+        """Reset walls, snakes and apples of the given games."""
+        boards = self.boards
+        boards[rows] = EMPTY
+        boards[rows, 0, :] = WALL
+        boards[rows, -1, :] = WALL
+        boards[rows, :, 0] = WALL
+        boards[rows, :, -1] = WALL
+
+        self._place_snakes(rows)
+        for _ in range(self.red_apple_count):
+            self._place_apples(rows, RED_APPLE)
+        for _ in range(self.green_apple_count):
+            self._place_apples(rows, GREEN_APPLE)
+
+    def _place_snakes(self, rows: np.ndarray) -> None:
+        """Generate a contiguous snake in a random orientation per game."""
+        length = self.snake_start_length
+        pending = rows
+        attempts = 0
+        max_attempts = 100
+        while pending.size and attempts < max_attempts:
+            pending = self._try_place_snakes(pending, length)
+            attempts += 1
+        if pending.size:
+            raise RuntimeError("Failed to place initial snake after"
+                               " multiple attempts.")
+
+    def _try_place_snakes(self, rows: np.ndarray,
+                          length: int) -> np.ndarray:
+        """Random self-avoiding walk per game; return the rows that failed."""
+        k = rows.size
+        path = np.empty((k, length, 2), dtype=np.intp)
+        path[:, 0] = self.rng.integers(1, self.map_size + 1, size=(k, 2))
+        ok = np.ones(k, dtype=bool)
+        neighbors = DIRECTIONS[np.newaxis, :, :]
+
+        for i in range(1, length):
+            candidates = path[:, i - 1, np.newaxis, :] + neighbors
+            free = self.boards[rows[:, np.newaxis],
+                               candidates[..., 0],
+                               candidates[..., 1]] == EMPTY
+            # A walk must not step back onto itself
+            for j in range(i):
+                free &= ~(candidates == path[:, np.newaxis, j]).all(axis=2)
+            scores = np.where(free, self.rng.random(free.shape), -1.0)
+            choice = scores.argmax(axis=1)
+            ok &= free.any(axis=1)
+            path[:, i] = candidates[np.arange(k), choice]
+
+        placed = rows[ok]
+        p = path[ok]
+        self.head_idx[placed] = 0
+        self.lengths[placed] = length
+        self.bodies[placed, :length] = p
+        self.boards[placed[:, np.newaxis], p[..., 0], p[..., 1]] = BODY
+        self.boards[placed, p[:, 0, 0], p[:, 0, 1]] = HEAD
+        self.directions[placed] = p[:, 0] - p[:, 1]
+        return rows[~ok]
+
+    def _place_apples(self, rows: np.ndarray, apple_type: int) -> None:
+        """Drop one apple on a uniformly drawn empty cell of each game."""
+        if rows.size == 0:
+            return
+        free = self.boards[rows] == EMPTY
+        scores = np.where(free, self.rng.random(free.shape), -1.0)
+        flat = scores.reshape(rows.size, -1).argmax(axis=1)
+        has_room = free.reshape(rows.size, -1).any(axis=1)
+        x, y = np.divmod(flat, free.shape[2])
+        self.boards[rows[has_room], x[has_room], y[has_room]] = apple_type